@@ -1,8 +1,11 @@
+import os
 from copy import deepcopy
+from struct import Struct
 
 MAX_X = 8
 MAX_Y = 12
 MAX_CARDS = 24
+MAX_MOVES = 60
 EMPTY_TILE = (0, 0)
 _DEFAULT_BOARD = [[EMPTY_TILE for _ in range(MAX_Y)] for _ in range(MAX_X)]
 
@@ -34,19 +37,40 @@ X_LETTERS = {
 }
 X_LETTERS_INVERSE = {v: k for k, v in X_LETTERS.items()}
 
-
-KEY_GEN = {
-    0: lambda move: (move.x, move.y),
-    1: lambda move: (move.x + move.placement % 2, move.y + (move.placement + 1) % 2),
-    2: lambda move: move.old_pos1,
-    3: lambda move: move.old_pos2
-}
-VAL_GEN = {
-    0: lambda move: move.card[0][0],
-    1: lambda move: move.card[move.placement % 2][(move.placement + 1) % 2],
-    2: lambda move: EMPTY_TILE,
-    3: lambda move: EMPTY_TILE
-}
+# Debug mode, every trusted move is also verified and replayed through make_move and both results are compared
+CHECK_TRUSTED_MOVES = bool(os.environ.get('DOUBLE_CARD_CHECK_MOVES'))
+
+# Binary position layout: 96 cells packed two per byte (4 bits each, color << 2 | dot), the move count, the number of
+# cards placed, each card as (x << 4 | y, type << 4 | placement), then last_moved with both of its old positions
+_TILE_CODES = {(color, dot): color << 2 | dot for color in range(3) for dot in range(3)}
+_CODE_TILES = {code: tile for tile, code in _TILE_CODES.items()}
+_BYTE_TILES = [(_CODE_TILES.get(b >> 4, EMPTY_TILE), _CODE_TILES.get(b & 0xF, EMPTY_TILE)) for b in range(256)]
+_HEADER = Struct('<{}sBB'.format(MAX_X * MAX_Y // 2))
+_CARDS = Struct('<{}s'.format(MAX_CARDS * 2))
+_LAST_MOVED = Struct('<BBBB')
+ENCODED_SIZE = _HEADER.size + _CARDS.size + _LAST_MOVED.size
+
+
+def _make_geometry():
+    """Cells covered by a card for every placement and in-bounds bottom-left position, the tiles put on them in the
+    same order, the cells that must be filled below it, and the cells that must be empty above it to remove it"""
+    cells, support, above = {}, {}, {}
+    for placement in PLACEMENTS:
+        dx, dy = (1, 0) if placement % 2 else (0, 1)
+        for x in range(MAX_X - dx):
+            for y in range(MAX_Y - dy):
+                covered = ((x, y), (x + dx, y + dy))
+                cells[placement, x, y] = covered
+                support[placement, x, y] = () if y == 0 else tuple((cx, y - 1) for cx, cy in covered if cy == y)
+                above[covered] = tuple((cx, y + 1 + dy) for cx, cy in covered if cy == y and y + 1 + dy < MAX_Y)
+    tiles = {placement: (card[0][0], card[placement % 2][(placement + 1) % 2])
+             for placement, card in PLACEMENTS.items()}
+    return cells, tiles, support, above
+
+
+CARD_CELLS, CARD_TILES, _SUPPORT, _ABOVE = _make_geometry()
+_HORIZONTAL = tuple(placement for placement in PLACEMENTS if placement % 2)
+_VERTICAL = tuple(placement for placement in PLACEMENTS if not placement % 2)
 
 
 def _count_tile(tile, count_red, count_white, count_full, count_open):
@@ -71,10 +95,6 @@ def _count_tile(tile, count_red, count_white, count_full, count_open):
     return count_red, count_white, count_full, count_open
 
 
-def _within_bounds(x, y, placement):
-    return MAX_X - placement % 2 > x >= 0 and MAX_Y - (placement + 1) % 2 > y >= 0
-
-
 def _str_tile(tile):
     # bg = '\033[0;38;41m {} \033[0m' if tile[0] == 1 else ('\033[0;38;47m {} \033[0m' if tile[0] == 2 else ' {} ')
     bg = 'R{}' if tile[0] == 1 else ('W{}' if tile[0] == 2 else ' {}')
@@ -83,15 +103,50 @@ def _str_tile(tile):
 
 
 def moves_to_positions(moves):
-    return {KEY_GEN[pos](move): VAL_GEN[pos](move)
-            for move in moves for pos in range(4 if move.type else 2)}
+    """Cells changed by the moves, a recycled card is lifted before it is put down again"""
+    positions = {}
+    for move in moves:
+        if move.type:
+            positions[move.old_pos1] = EMPTY_TILE
+            positions[move.old_pos2] = EMPTY_TILE
+        positions.update(zip(move.cells, move.tiles))
+    return positions
+
+
+def _encode_pos(pos):
+    return 0xFF if pos[0] < 0 else pos[0] << 4 | pos[1]
+
+
+def _decode_pos(byte):
+    return (-1, -1) if byte == 0xFF else (byte >> 4, byte & 0xF)
 
 
 class GameBoard:
+    @staticmethod
+    def from_bytes(data):
+        """Rebuilds a board from the fixed-size encoding produced by to_bytes, accepts any bytes-like object"""
+        cells, num_moves, num_cards = _HEADER.unpack_from(data)
+        cards, = _CARDS.unpack_from(data, _HEADER.size)
+        pos, card, old_pos1, old_pos2 = _LAST_MOVED.unpack_from(data, _HEADER.size + _CARDS.size)
+
+        board = GameBoard.__new__(GameBoard)  # Every field is set below, copying the default board is wasted
+        tiles = [tile for byte in cells for tile in _BYTE_TILES[byte]]
+        board._board = [tiles[x * MAX_Y:(x + 1) * MAX_Y] for x in range(MAX_X)]
+        board._moves = {(cards[i] >> 4, cards[i] & 0xF): Move(cards[i + 1] >> 4, cards[i + 1] & 0xF,
+                                                              cards[i] >> 4, cards[i] & 0xF)
+                        for i in range(0, num_cards * 2, 2)}
+        board._num_moves = num_moves
+        board.last_moved = None
+        if card:
+            board.last_moved = Move(card >> 4, card & 0xF, pos >> 4, pos & 0xF,
+                                    _decode_pos(old_pos1), _decode_pos(old_pos2))
+            if (board.last_moved.x, board.last_moved.y) in board._moves:
+                board._moves[board.last_moved.x, board.last_moved.y] = board.last_moved
+        return board
 
     def __init__(self):
         self._board = deepcopy(_DEFAULT_BOARD)
-        self._moves = []
+        self._moves = {}  # Placed cards by bottom-left position, in the order they were last moved
         self._num_moves = 0
         self.last_moved = None
 
@@ -107,26 +162,39 @@ class GameBoard:
         buff += '\n' + '--' * 9
         return buff
 
+    @property
+    def num_moves(self):
+        return self._num_moves
+
+    def to_bytes(self):
+        """Encodes the full position into ENCODED_SIZE bytes, cheaper to ship between processes than pickling"""
+        codes = [_TILE_CODES[tile] for column in self._board for tile in column]
+        cells = bytes(codes[i] << 4 | codes[i + 1] for i in range(0, MAX_X * MAX_Y, 2))
+        cards = bytes(byte for move in self._moves.values()
+                      for byte in (move.x << 4 | move.y, move.type << 4 | move.placement))
+        last = self.last_moved
+        return b''.join([
+            _HEADER.pack(cells, self._num_moves, len(self._moves)),
+            _CARDS.pack(cards),
+            _LAST_MOVED.pack(last.x << 4 | last.y, last.type << 4 | last.placement,
+                             _encode_pos(last.old_pos1), _encode_pos(last.old_pos2)) if last else
+            _LAST_MOVED.pack(0, 0, 0, 0)
+        ])
+
     def _apply(self, move):
-        for x in range(2):
-            for y in range(2):
-                if not move.card[x][y]:
-                    continue
-                self._board[move.x + x][move.y + y] = move.card[x][y]
+        for (x, y), tile in zip(move.cells, move.tiles):
+            self._board[x][y] = tile
 
     def _space_avail(self, x, y, placement):
         """Checks that the given placement would not overlap existing placed cards"""
-        into_tile = self._board[x][y]
-        into_tile2 = self._board[x + placement % 2][y + (placement + 1) % 2]
-        return into_tile == EMPTY_TILE and into_tile2 == EMPTY_TILE
+        return all(self._board[cx][cy] == EMPTY_TILE for cx, cy in CARD_CELLS[placement, x, y])
 
     def _has_support(self, x, y, placement):
         """Checks that the given placement would not hang over an empty cell"""
-        return y == 0 or (
-                self._board[x][y - 1] != EMPTY_TILE and (placement % 2 == 0 or self._board[x + 1][y - 1] != EMPTY_TILE))
+        return all(self._board[cx][cy] != EMPTY_TILE for cx, cy in _SUPPORT[placement, x, y])
 
     def _verify_move(self, move):
-        if not _within_bounds(move.x, move.y, move.placement):
+        if not move.cells:
             return Result({'within bounds': False})
         return Result({
             'has support': self._has_support(move.x, move.y, move.placement)
@@ -155,17 +223,11 @@ class GameBoard:
         """Checks that the card can be removed and keep the board state legal
         There cannot be additional cards placed above the one being moved
         """
-        return self._board[move.old_pos1[0]][move.old_pos1[1] + 2] == EMPTY_TILE if \
-            move.old_pos1[1] - move.old_pos2[1] == 0 else (
-                self._board[move.old_pos1[0]][move.old_pos1[1] + 1] == EMPTY_TILE and
-                self._board[move.old_pos1[0] + 1][move.old_pos1[1] + 1] == EMPTY_TILE)
+        return all(self._board[x][y] == EMPTY_TILE for x, y in _ABOVE.get((move.old_pos1, move.old_pos2), ()))
 
     def _find_old_move(self, move):
-        return [
-            m for m in self._moves if
-            move.old_pos1[0] == m.x and move.old_pos1[1] == m.y and (
-                    m.x + m.placement % 2 == move.old_pos2[0] and m.y + (m.placement + 1) % 2 == move.old_pos2[1])
-        ]
+        m = self._moves.get(move.old_pos1)
+        return [m] if m and m.cells == (move.old_pos1, move.old_pos2) else []
 
     def _verify_recycle(self, move):
         """Checks that the given move would a legal recycling"""
@@ -188,9 +250,9 @@ class GameBoard:
         return Result(result)
 
     def _remove(self, old_move):
-        self._moves.remove(old_move)
-        self._board[old_move.x][old_move.y] = EMPTY_TILE
-        self._board[old_move.x + old_move.placement % 2][old_move.y + (old_move.placement + 1) % 2] = EMPTY_TILE
+        del self._moves[old_move.x, old_move.y]
+        for x, y in old_move.cells:
+            self._board[x][y] = EMPTY_TILE
 
     def _recycle_card(self, move):
         result = self._verify_recycle(move)
@@ -310,7 +372,7 @@ class GameBoard:
         return False
 
     def is_winning_board(self):
-        if self._num_moves >= 60:
+        if self._num_moves >= MAX_MOVES:
             return Result({'draw': 'number of moves'})
         return self._win_diagonal() or self._win_horizontal() or self._win_vertical()
 
@@ -318,11 +380,38 @@ class GameBoard:
         """Executes a move on the board, affecting state if the move is found to be legal"""
         result = self._recycle_card(move) if move.type else self._add_card(move)
         if result.success:
-            self._moves.append(move)
-            self.last_moved = move
-            self._num_moves += 1
+            self._record(move)
         return result
 
+    def _record(self, move):
+        self._moves[move.x, move.y] = move
+        self.last_moved = move
+        self._num_moves += 1
+
+    def apply_move(self, move):
+        """Executes a move known to be legal, such as one from generate_moves, without verifying it
+        Human input must go through make_move instead"""
+        if CHECK_TRUSTED_MOVES:
+            checked = GameBoard.from_bytes(self.to_bytes())
+            result = checked.make_move(move)
+            if not result.success:
+                raise ValueError('Trusted move {} is not legal (reasons: {})'.format(
+                    move, [key for key, value in result.conditions.items() if not value]))
+
+        if move.type:
+            self._remove(self._moves[move.old_pos1])
+        self._apply(move)
+        self._record(move)
+
+        if CHECK_TRUSTED_MOVES and checked.to_bytes() != self.to_bytes():
+            raise ValueError('Trusted move {} left a different board than make_move'.format(move))
+        return _TRUSTED
+
+    def position_key(self, changed_positions):
+        """Canonical key of the board with forecasted moves applied, the same whichever move order reached it"""
+        return bytes(_TILE_CODES[changed_positions.get((x, y)) or tile]
+                     for x, column in enumerate(self._board) for y, tile in enumerate(column))
+
     def board_lookup(self, changed_positions, x, y):
         """Looks up a position on the board, accounting for forecasted moves"""
         return changed_positions.get((x, y)) or self._board[x][y]
@@ -334,44 +423,50 @@ class GameBoard:
                 return y
         return MAX_Y
 
+    def _heights(self, changed_positions):
+        return [self._max_height_for_x(x, changed_positions) for x in range(MAX_X)]
+
     def _generate_add_moves(self, changed_positions):
         """Looks at every position on the board where a card can be added on top"""
-        for x in range(MAX_X):
-            y = self._max_height_for_x(x, changed_positions)
-
+        heights = self._heights(changed_positions)
+        for x, y in enumerate(heights):
             if y < MAX_Y - 1:
-                yield from (Move(0, placement, x, y) for placement in [2, 4, 6, 8])
+                yield from (Move(0, placement, x, y) for placement in _VERTICAL)
 
-            if x < MAX_X - 1 and MAX_Y > y == self._max_height_for_x(x + 1, changed_positions):
-                yield from (Move(0, placement, x, y) for placement in [1, 3, 5, 7])
+            if x < MAX_X - 1 and MAX_Y > y == heights[x + 1]:
+                yield from (Move(0, placement, x, y) for placement in _HORIZONTAL)
 
     def _can_recycle_move(self, move, changed_positions):
-        return self.board_lookup(changed_positions, move.x, move.y + 2) == EMPTY_TILE if \
-            move.placement % 2 else (
-                self._board[move.x][move.y + 1] == EMPTY_TILE and
-                self._board[move.x + 1][move.y + 1] == EMPTY_TILE
-        )
+        return all(self.board_lookup(changed_positions, x, y) == EMPTY_TILE for x, y in _ABOVE[move.cells])
+
+    def _forecast_cards(self, moves):
+        """Placed cards once the forecasted moves are made, the last one moved last"""
+        cards = self._moves.copy()
+        for move in moves:
+            if move.type:
+                cards.pop(move.old_pos1, None)
+            cards[move.x, move.y] = move
+        return list(cards.values())
 
     def _generate_recycle_moves(self, moves, changed_positions):
-        """Looks at every placed card that can be removed, then looks at every possible replacement for each card"""
-        recyclable_moves = [move for move in (self._moves + moves)[:-1] if
+        """Looks at every placed card that can be removed, then looks at every possible replacement for each card
+        A card cannot be put back where it was, unless it is turned around its bottom-left position"""
+        recyclable_moves = [move for move in self._forecast_cards(moves)[:-1] if
                             self._can_recycle_move(move, changed_positions)]
+        base_heights = self._heights(changed_positions)
         for move in recyclable_moves:
-            old_pos1 = (move.x, move.y)
-            old_pos2 = (move.x + move.placement % 2, move.y + (move.placement - 1) % 2)
-            _changed_positions = changed_positions.copy()
-            _changed_positions.update({
-                old_pos1: EMPTY_TILE,
-                old_pos2: EMPTY_TILE
-            })
-            for x in range(MAX_X):
-                y = self._max_height_for_x(x, _changed_positions)
-
-                if y < MAX_Y - 1:
-                    yield from (Move(1, placement, x, y, old_pos1, old_pos2) for placement in [2, 4, 6, 8])
-
-                if x < MAX_X - 1 and MAX_Y > y == self._max_height_for_x(x + 1, _changed_positions):
-                    yield from (Move(1, placement, x, y, old_pos1, old_pos2) for placement in [1, 3, 5, 7])
+            old_pos1, old_pos2 = move.cells
+            heights = base_heights.copy()
+            for x, y in move.cells:  # Nothing is above the card, its columns drop to where it starts
+                heights[x] = min(heights[x], y)
+            for x, y in enumerate(heights):
+                if y < MAX_Y - 1 and (x, y) != old_pos2:
+                    yield from (Move(1, placement, x, y, old_pos1, old_pos2) for placement in _VERTICAL
+                                if (x, y) != old_pos1 or placement != move.placement)
+
+                if x < MAX_X - 1 and MAX_Y > y == heights[x + 1] and (x, y) != old_pos2 and (x + 1, y) != old_pos1:
+                    yield from (Move(1, placement, x, y, old_pos1, old_pos2) for placement in _HORIZONTAL
+                                if (x, y) != old_pos1 or placement != move.placement)
 
     def _generate_moves(self, moves):
         """Returns a generator for all possible moves with the current board state and given forecasted moves"""
@@ -381,11 +476,15 @@ class GameBoard:
             return self._generate_add_moves(changed_positions)
         return self._generate_recycle_moves(moves, changed_positions)
 
+    def generate_moves(self, moves=None):
+        """Lists every legal move after the given forecasted moves"""
+        return list(self._generate_moves(moves or []))
+
     def possible_moves(self, depth, moves=None, level=1):
         if level < depth - 1:
             return {move: self.possible_moves(depth, moves + [move] if moves else [move], level + 1)
                     for move in self._generate_moves(moves or [])}
-        return list(self._generate_moves(moves))  # Max depth reached
+        return self.generate_moves(moves)  # Max depth reached
 
 
 class Move:
@@ -413,6 +512,8 @@ class Move:
         self.card = PLACEMENTS[placement]
         self.x = x
         self.y = y
+        self.cells = CARD_CELLS.get((placement, x, y))  # None when the card would not fit on the board
+        self.tiles = CARD_TILES[placement]
         self.old_pos1 = old_pos1
         self.old_pos2 = old_pos2
 
@@ -446,3 +547,6 @@ class Result:
     def __init__(self, conditions, eval_=all):
         self.conditions = conditions
         self.success = eval_(conditions.values())
+
+
+_TRUSTED = Result({'trusted': True})
@@ -0,0 +1,116 @@
+from concurrent.futures import Future
+from math import isnan
+from queue import Queue, Empty
+from threading import Thread
+from time import perf_counter
+
+from board import moves_to_positions
+from heuristics import WEIGHTS, cache, informed, score_positions
+
+BATCH_SIZE = 64
+MAX_DELAY = 0.002  # Seconds a position waits for others to fill its batch at most
+
+
+class _Request:
+    __slots__ = ('board', 'moves', 'condition', 'weights', 'key', 'future')
+
+    def __init__(self, board, moves, condition, weights):
+        self.board = board
+        self.moves = moves
+        self.condition = condition
+        self.weights = weights
+        position = board.position_key(moves_to_positions(moves))
+        self.key = (position, condition) if weights is None or weights is WEIGHTS else \
+            (position, condition, tuple(weights))
+        self.future = Future()
+
+
+class EvaluationService:
+    """Scores leaf positions submitted by any number of searches running in other threads, in batches
+    A batch is scored once it holds batch_size positions or its first position has waited max_delay seconds
+    The evaluation cache is only used from the service thread while it runs"""
+
+    def __init__(self, batch_size=BATCH_SIZE, max_delay=MAX_DELAY):
+        self._batch_size = batch_size
+        self._max_delay = max_delay
+        self._queue = Queue()
+        self._thread = Thread(target=self._run, name='evaluation service', daemon=True)
+        self._thread.start()
+        self.num_batches = 0
+        self.num_positions = 0
+
+    def submit(self, board, moves, condition, weights=None):
+        """Queues the position after the moves, the same as informed(board, moves, condition, weights)
+        Returns a future of its score, the board must not change until it is done"""
+        request = _Request(board, moves, condition, weights)
+        self._queue.put(request)
+        return request.future
+
+    def evaluate(self, board, moves, condition, weights=None):
+        return self.submit(board, moves, condition, weights).result()
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    @property
+    def mean_batch_size(self):
+        return self.num_positions / self.num_batches if self.num_batches else 0.
+
+    def _run(self):
+        while True:
+            request = self._queue.get()
+            if request is None:
+                return
+            batch = [request]
+            deadline = perf_counter() + self._max_delay
+            while len(batch) < self._batch_size:
+                try:
+                    request = self._queue.get(timeout=max(deadline - perf_counter(), 0))
+                except Empty:
+                    break
+                if request is None:
+                    self._flush(batch)
+                    return
+                batch.append(request)
+            self._flush(batch)
+
+    def _flush(self, batch):
+        try:
+            self._score(batch)
+        except Exception as error:  # Never leave a search waiting on a future that will not complete
+            for request in batch:
+                if not request.future.done():
+                    request.future.set_exception(error)
+
+    def _score(self, batch):
+        """Scores the distinct positions of the batch not found in the cache with one call per set of weights"""
+        self.num_batches += 1
+        self.num_positions += len(batch)
+        pending = {}
+        for request in batch:
+            value = cache.get(request.key)
+            if value is not None:
+                request.future.set_result(value)
+            else:
+                pending.setdefault(request.key, []).append(request)
+
+        by_weights = {}
+        for key in pending:
+            by_weights.setdefault(key[2:], []).append(key)  # Custom weights are the third element of the key
+        for weights, keys in by_weights.items():
+            for key, value in zip(keys, score_positions([key[0] for key in keys], weights[0] if weights else None)):
+                if not isnan(value):
+                    cache.put(key, value)
+                for request in pending[key]:
+                    if isnan(value):  # Winning for both players, the order of the moves breaks the tie
+                        request.future.set_result(
+                            informed(request.board, request.moves, request.condition, request.weights))
+                    else:
+                        request.future.set_result(value)
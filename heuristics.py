@@ -1,3 +1,6 @@
+import json
+import os
+from collections import OrderedDict
 from math import isnan, isinf
 
 from board import R, W, F, O, MAX_X, MAX_Y, EMPTY_TILE, moves_to_positions
@@ -15,6 +18,91 @@ DIRECTION_REVERSED = 1 << 2
 INF = float('inf')
 
 WEIGHTS = [0, 1, 10, 100, INF]
+WEIGHTS_FILE = os.environ.get('DOUBLE_CARD_WEIGHTS', 'weights.json')
+EVAL_CACHE_SIZE = 100000
+
+
+class EvalCache:
+    """Bounded LRU of evaluations keyed by canonical position, least recently used entries are evicted first"""
+
+    def __init__(self, max_size=EVAL_CACHE_SIZE):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._added = None  # Keys put since take_added was last called, once track_added has been called
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.
+
+    def get(self, key):
+        value = self._entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        self._entries[key] = value
+        if self._added is not None:
+            self._added.append(key)
+        if len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self):
+        return {'size': len(self), 'hits': self.hits, 'misses': self.misses, 'hit rate': self.hit_rate}
+
+    def entries(self):
+        """Entries from least to most recently used, to be saved and restored later"""
+        return list(self._entries.items())
+
+    def restore(self, entries):
+        self._entries = OrderedDict(entries)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def track_added(self):
+        """Starts recording the keys put, so the cache can be saved incrementally with take_added"""
+        self._added = []
+
+    def take_added(self):
+        """Entries put since track_added or the previous call that are still cached"""
+        entries = [(key, self._entries[key]) for key in dict.fromkeys(self._added) if key in self._entries]
+        self._added = []
+        return entries
+
+
+cache = EvalCache()
+
+
+def load_weights(path):
+    """Reads tuned weights for 0 to 3 tiles of a sequence, a complete sequence is always worth INF"""
+    with open(path) as file:
+        weights = json.load(file)['weights']
+    return [float(weight) for weight in weights[:SEQUENCE_LENGTH]] + [INF]
+
+
+def save_weights(path, weights):
+    with open(path, 'w') as file:
+        json.dump({'weights': list(weights[:SEQUENCE_LENGTH])}, file)
+
+
+def set_weights(weights):
+    """Replaces the default weights used by informed, cached evaluations made with the old ones are dropped"""
+    WEIGHTS[:] = weights
+    cache.clear()
 
 
 def _count_sequence(sequence):
@@ -64,15 +152,45 @@ def _count_sequence(sequence):
     return count_color, count_dot
 
 
-def _make_sequence(board, changed_positions, x, y, direction):
-    return [board.board_lookup(changed_positions,
-                               x + i * (direction & DIRECTION_X) * ([1, -1][bool(direction & DIRECTION_REVERSED)]),
-                               y + i * bool(direction & DIRECTION_Y))
-            for i in range(SEQUENCE_LENGTH)]
+def _make_window(x, y, direction):
+    step_x = (direction & DIRECTION_X) * ([1, -1][bool(direction & DIRECTION_REVERSED)])
+    step_y = bool(direction & DIRECTION_Y)
+    return tuple((x + i * step_x, y + i * step_y) for i in range(SEQUENCE_LENGTH))
 
 
-def _simple_iterate(board, moves, fn):
-    changed_positions = moves_to_positions(moves)
+def _make_windows():
+    """Lists the cells of every sequence on the board, keyed by (x, y, direction), and indexes them by cell"""
+    windows = {}
+    for x in range(MAX_X):
+        for y in range(MAX_Y):
+            if y < MAX_Y - 3:
+                windows[x, y, DIRECTION_Y] = _make_window(x, y, DIRECTION_Y)
+
+            if x < MAX_X - 3:
+                windows[x, y, DIRECTION_X] = _make_window(x, y, DIRECTION_X)
+
+            if x < MAX_X - 3 and y < MAX_Y - 3:
+                windows[x, y, DIRECTION_X | DIRECTION_Y] = _make_window(x, y, DIRECTION_X | DIRECTION_Y)
+
+            if x >= 3 and y < MAX_Y - 3:
+                direction = DIRECTION_X | DIRECTION_Y | DIRECTION_REVERSED
+                windows[x, y, direction] = _make_window(x, y, direction)
+
+    cell_windows = {}
+    for key, cells in windows.items():
+        for cell in cells:
+            cell_windows.setdefault(cell, []).append(key)
+    return windows, cell_windows
+
+
+_WINDOWS, _CELL_WINDOWS = _make_windows()
+
+
+def _make_sequence(board, changed_positions, key):
+    return [board.board_lookup(changed_positions, x, y) for x, y in _WINDOWS[key]]
+
+
+def _simple_iterate(board, changed_positions, fn):
     e = 0
     for x in range(MAX_X):
         for y in range(MAX_Y):
@@ -83,54 +201,172 @@ def _simple_iterate(board, moves, fn):
     return e
 
 
-def _sequences_iterate(board, moves, fn):
-    changed_positions = moves_to_positions(moves)
+def _sequences_iterate(board, changed_positions, fn):
     e = 0
     wins = set()
-
-    def fn_sequence(x, y, direction):
-        val = fn(_make_sequence(board, changed_positions, x, y, direction))
+    for key in _WINDOWS:
+        val = fn(_make_sequence(board, changed_positions, key))
         if isinf(val) or isnan(val):
-            wins.add((x, y))
-        return val
+            wins.add(key)
+        e += val
+    return e, wins
 
-    for x in range(MAX_X):
-        for y in range(MAX_Y):
-            if y < MAX_Y - 3:
-                e += fn_sequence(x, y, DIRECTION_Y)
 
-            if x < MAX_X - 3:
-                e += fn_sequence(x, y, DIRECTION_X)
+def _is_winning(sequence):
+    return SEQUENCE_LENGTH in _count_sequence(sequence)
 
-            if x < MAX_X - 3 and y < MAX_Y - 3:
-                e += fn_sequence(x, y, DIRECTION_X | DIRECTION_Y)
 
-            if x >= 3 and y < MAX_Y - 3:
-                e += fn_sequence(x, y, DIRECTION_X | DIRECTION_Y | DIRECTION_REVERSED)
+def _first_win(board, moves, wins):
+    """Applies the moves one at a time, rescoring only the sequences passing through the cells each one changes
+    Returns the index of the first move after which a winning sequence exists, None if there is none
+    wins is the set of winning sequences once all moves are applied"""
+    if not moves:
+        return None
 
-    return e, wins
+    touched = {key for cell in moves_to_positions(moves) for key in _CELL_WINDOWS[cell]}
+    if wins - touched:  # Sequences no move changes are winning after every move
+        return 0
+
+    changed_positions = {}
+    winning = {key for key in touched if _is_winning(_make_sequence(board, changed_positions, key))}
+    for i, move in enumerate(moves):
+        positions = moves_to_positions([move])
+        changed_positions.update(positions)
+        for key in {key for cell in positions for key in _CELL_WINDOWS[cell]}:
+            if _is_winning(_make_sequence(board, changed_positions, key)):
+                winning.add(key)
+            else:
+                winning.discard(key)
+        if winning:
+            return i
+    return None
+
+
+def completed_sequences(board, moves):
+    """Checks only the sequences passing through the cells filled by the last of the given moves
+    Returns whether it completes a winning sequence of colors, and whether it completes one of dots"""
+    changed_positions = moves_to_positions(moves)
+    colors, dots = False, False
+    for key in {key for cell in moves[-1].cells for key in _CELL_WINDOWS[cell]} if moves else ():
+        count_color, count_dot = _count_sequence(_make_sequence(board, changed_positions, key))
+        colors = colors or count_color == SEQUENCE_LENGTH
+        dots = dots or count_dot == SEQUENCE_LENGTH
+    return colors, dots
 
 
 def naive(board, moves):
     def naive_count(tile, x, y):
         return _NAIVE_WEIGHTS[tile] * (y * 10 + x + 1)
 
-    return _simple_iterate(board, moves, naive_count)
+    changed_positions = moves_to_positions(moves)
+    key = (board.position_key(changed_positions), None)
+    val = cache.get(key)
+    if val is None:
+        val = _simple_iterate(board, changed_positions, naive_count)
+        cache.put(key, val)
+    return val
+
 
+def informed(board, moves, condition, weights=None):
+    weights = weights or WEIGHTS
 
-def informed(board, moves, condition):
     def sequence_eval(sequence):
         count_color, count_dot = _count_sequence(sequence)
-        return WEIGHTS[count_color] - WEIGHTS[count_dot]
+        return weights[count_color] - weights[count_dot]
+
+    changed_positions = moves_to_positions(moves)
+    key = (board.position_key(changed_positions), condition) if weights is WEIGHTS else \
+        (board.position_key(changed_positions), condition, tuple(weights))
+    val = cache.get(key)
+    if val is not None:
+        return val
 
-    val, wins = _sequences_iterate(board, moves, sequence_eval)
+    val, wins = _sequences_iterate(board, changed_positions, sequence_eval)
     if not isnan(val):
+        cache.put(key, val)
         return val
 
-    # Board is in a winning state for both players, need to determine tiebreaker
-    for i in range(len(moves)):
-        sub_val, _ = _sequences_iterate(board, moves[:i + 1], sequence_eval)
-        if isinf(sub_val) or isnan(sub_val):
-            return INF * (-1, 1)[(condition + len(moves) - i - 1) % 2]
+    # Board is in a winning state for both players, the player who first completed a sequence wins
+    # The winner depends on the order of the moves, so this result is never cached
+    i = _first_win(board, moves, wins)
+    if i is not None:
+        return INF * (-1, 1)[(condition + len(moves) - i - 1) % 2]
 
     return INF * (-1, 1)[condition]
+
+
+# Batched scoring reads position keys, one tile code per cell in column order. Each code (color << 2 | dot) is a nibble
+# with one bit per kind of tile, so the joined keys of a batch parse as a single integer and Python's big integers act
+# as bit vectors over every cell of every position. A window is found by shifting by its step between cells, and
+# windows are counted at once with bitwise adders, one direction per bit of the nibble of the cell they start from
+_CELLS = MAX_X * MAX_Y
+_NIBBLES = bytes(ord('{:x}'.format(code & 0xF)) for code in range(256))  # bytes.translate table, code to hex digit
+_DIRECTIONS = [(step, sum(1 << 4 * (x * MAX_Y + y) for x, y, d in _WINDOWS if d == direction))
+               for direction, step in [(DIRECTION_Y, 1), (DIRECTION_X, MAX_Y), (DIRECTION_X | DIRECTION_Y, MAX_Y + 1),
+                                       (DIRECTION_X | DIRECTION_Y | DIRECTION_REVERSED, 1 - MAX_Y)]]
+_POSITION_BYTES = 4 * _CELLS // 8
+_REPEATS = {}  # Batch size -> multiplier copying a position-sized mask to every position of the batch
+
+
+def _repeat(size):
+    repeat = _REPEATS.get(size)
+    if repeat is None:
+        repeat = _REPEATS[size] = sum(1 << 4 * _CELLS * p for p in range(size))
+    return repeat
+
+
+def _count_windows(own, other):
+    """Adds up the own tiles of every window holding none of the other kind
+    Returns the windows holding exactly 1 to SEQUENCE_LENGTH own tiles"""
+    low, high = own[0] ^ own[1], own[0] & own[1]
+    low2, high2 = own[2] ^ own[3], own[2] & own[3]
+    carry = low & low2
+    live = ~(other[0] | other[1] | other[2] | other[3])
+    bit0 = (low ^ low2) & live
+    bit1 = (high ^ high2 ^ carry) & live
+    bit2 = ((high & high2) | (carry & (high ^ high2))) & live
+    return [bit0 & ~bit1, bit1 & ~bit0, bit0 & bit1, bit2]
+
+
+def score_positions(keys, weights=None):
+    """Scores many position keys in one pass, the same as informed does one at a time
+    Positions winning for both players are nan, informed breaks those ties from the order of the moves"""
+    weights = weights or WEIGHTS
+    if not keys:
+        return []
+    repeat = _repeat(len(keys))
+    cells = int(b''.join(keys)[::-1].translate(_NIBBLES), 16)
+
+    colors, dots = [0] * SEQUENCE_LENGTH, [0] * SEQUENCE_LENGTH
+    for offset, (step, starts) in enumerate(_DIRECTIONS):
+        starts *= repeat
+        tiles = [cells >> 4 * k * step if step > 0 else cells << -4 * k * step for k in range(SEQUENCE_LENGTH)]
+        full, open_, red, white = [[tile >> bit & starts for tile in tiles] for bit in range(4)]
+        for count, windows in enumerate(zip(_count_windows(red, white), _count_windows(white, red))):
+            colors[count] |= (windows[0] | windows[1]) << offset
+        for count, windows in enumerate(zip(_count_windows(full, open_), _count_windows(open_, full))):
+            dots[count] |= (windows[0] | windows[1]) << offset
+
+    size = len(keys) * _POSITION_BYTES
+    colors = [windows.to_bytes(size, 'little') for windows in colors]
+    dots = [windows.to_bytes(size, 'little') for windows in dots]
+    values = []
+    for start in range(0, size, _POSITION_BYTES):
+        e, count_color, count_dot = 0, 0, 0
+        for count in range(1, SEQUENCE_LENGTH + 1):
+            windows_color = int.from_bytes(colors[count - 1][start:start + _POSITION_BYTES], 'little').bit_count()
+            windows_dot = int.from_bytes(dots[count - 1][start:start + _POSITION_BYTES], 'little').bit_count()
+            if windows_color:
+                e += weights[count] * windows_color
+                count_color += windows_color
+            if windows_dot:
+                e -= weights[count] * windows_dot
+                count_dot += windows_dot
+        if weights[0]:
+            e += weights[0] * (count_dot - count_color)
+        values.append(e)
+    return values
+
+
+if os.path.exists(WEIGHTS_FILE):
+    set_weights(load_weights(WEIGHTS_FILE))
@@ -1,7 +1,12 @@
+import os
 from contextlib import contextmanager
 
 from board import GameBoard, Result
+from mcts import MCTS
 from players import Player
+from profiling import PROFILE_FILE, Profiler
+from records import GameRecord, RECORDS_FILE, write_record
+from snapshot import SNAPSHOT_FILE, load_snapshot, remove_snapshot, save_snapshot
 
 
 @contextmanager
@@ -37,6 +42,7 @@ def setup():
 
     first = False
     trace_file_path = None
+    monte_carlo = False
     if computer:
         prompt = 'File name for trace? (Empty for no trace): '
         trace_file_path = input(prompt)
@@ -48,40 +54,89 @@ def setup():
             first = input(prompt)
         first = first[0].upper() == 'C'
 
+        prompt = 'Computer engine, minimax or monte carlo? (M/C, empty for minimax): '
+        engine = input(prompt)
+        while engine and engine[0].upper() not in ('M', 'C'):
+            print('Invalid input, expecting: (M/C)')
+            engine = input(prompt)
+        monte_carlo = engine[:1].upper() == 'C'
+
     p1_condition, p2_condition = win_condition()
-    return [Player('P1', not computer or not first, p1_condition),
-            Player('P2', not computer or first, p2_condition)], trace_file_path
+    return [Player('P1', not computer or not first, p1_condition, MCTS(p1_condition) if monte_carlo else None),
+            Player('P2', not computer or first, p2_condition, MCTS(p2_condition) if monte_carlo else None)], \
+        trace_file_path
 
 
-def main():
-    print('Welcome to the Double Card game!')
-    current_player = 0
-    players, trace_file_path = setup()
-    board = GameBoard()
+def play_game(players, board, trace_file=None, current_player=0, history=None, on_move=None):
+    """Alternates moves between the players until the game ends, adding each move made to history if given
+    on_move is called with the board and the number of the player to move next after every move
+    Returns the final result and the number of the player who would have played next"""
     game_result = None
-    with open(trace_file_path, 'w') if trace_file_path else _no_context() as file:
-        while not game_result or not game_result.success:
-            result = players[current_player % 2].move(board, file)
-
-            while players[current_player % 2].is_human and not result.success:
-                print('Move not legal, please enter a different move. (reasons: {})'.format(
-                    ['{}:{}'.format(key, value) for key, value in result.conditions.items() if not value]))
-                result = players[current_player % 2].move(board, file)
-
-            if not result.success:
-                print('Failed to get valid move for player {}.'.format(current_player % 2 + 1))
-                game_result = Result({players[(current_player + 1) % 2].condition[0]: True})  # Lose the game
-                break
-
-            print(str(board))
-            current_player += 1
-            game_result = board.is_winning_board()
-
+    while not game_result or not game_result.success:
+        result = players[current_player % 2].move(board, trace_file)
+
+        while players[current_player % 2].is_human and not result.success:
+            print('Move not legal, please enter a different move. (reasons: {})'.format(
+                ['{}:{}'.format(key, value) for key, value in result.conditions.items() if not value]))
+            result = players[current_player % 2].move(board, trace_file)
+
+        if not result.success:
+            print('Failed to get valid move for player {}.'.format(current_player % 2 + 1))
+            game_result = Result({players[(current_player + 1) % 2].condition[0]: True})  # Lose the game
+            break
+
+        if history is not None:
+            history.append(board.last_moved)
+        print(str(board))
+        current_player += 1
+        if on_move:
+            on_move(board, current_player)
+        game_result = board.is_winning_board()
+    return game_result, current_player
+
+
+def winner(players, game_result, current_player):
+    """Returns the index of the winning player, None for a tie"""
     winning = [key for key, value in game_result.conditions.items() if value]
     if any(k in players[(current_player - 1) % 2].condition for k in winning):
-        print('Player {} has won the game!'.format((current_player - 1) % 2 + 1))
+        return (current_player - 1) % 2
     elif any(k in players[current_player % 2].condition for k in winning):
-        print('Player {} has won the game!'.format(current_player % 2 + 1))
+        return current_player % 2
+    return None
+
+
+def main():
+    print('Welcome to the Double Card game!')
+    if SNAPSHOT_FILE and os.path.exists(SNAPSHOT_FILE):
+        board, players, history, current_player, trace_file_path = load_snapshot(SNAPSHOT_FILE)
+        print('Resuming the game saved in {} after {} moves'.format(SNAPSHOT_FILE, board.num_moves))
+        print(str(board))
+    else:
+        players, trace_file_path = setup()
+        board, history, current_player = GameBoard(), [], 0
+    profiler = Profiler() if PROFILE_FILE else None
+    if profiler:
+        for player in players:
+            if not player.is_human:
+                player.move = profiler.wrap(player.move)
+
+    def checkpoint(_, next_player):
+        save_snapshot(SNAPSHOT_FILE, board, players, history, next_player, trace_file_path)
+
+    with open(trace_file_path, 'a' if board.num_moves else 'w') if trace_file_path else _no_context() as file:
+        game_result, current_player = play_game(players, board, file, current_player, history,
+                                                checkpoint if SNAPSHOT_FILE else None)
+    if SNAPSHOT_FILE:
+        remove_snapshot(SNAPSHOT_FILE)
+    if profiler:
+        profiler.write_report(PROFILE_FILE)
+        print('Profile written to {}'.format(PROFILE_FILE))
+    if RECORDS_FILE:
+        write_record(RECORDS_FILE, GameRecord([player.condition for player in players], history))
+
+    won = winner(players, game_result, current_player)
+    if won is not None:
+        print('Player {} has won the game!'.format(won + 1))
     else:
         print('Game is a tie! ({})'.format(game_result.conditions.get('draw', 'invalid')))
 
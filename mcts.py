@@ -0,0 +1,195 @@
+import random
+from math import log, sqrt
+from multiprocessing import Pool
+from time import perf_counter
+
+from board import GameBoard, Move, MAX_MOVES
+from heuristics import completed_sequences
+
+PLAYOUTS = 2000
+EXPLORATION = sqrt(2)
+WIN = 1.
+DRAW = .5
+LOSS = 0.
+
+
+class _Node:
+    __slots__ = ('move', 'parent', 'children', 'untried', 'visits', 'wins', 'result')
+
+    def __init__(self, move=None, parent=None, result=None):
+        self.move = move
+        self.parent = parent
+        self.children = []
+        self.untried = None  # Moves not expanded yet, generated on the first visit
+        self.visits = 0
+        self.wins = 0.  # From the point of view of the player who made the move leading here
+        self.result = result  # Game outcome for that same player when the move ends the game
+
+    def select(self):
+        """Upper confidence bound for trees"""
+        log_visits = log(self.visits)
+        return max(self.children,
+                   key=lambda child: child.wins / child.visits + EXPLORATION * sqrt(log_visits / child.visits))
+
+
+class MCTS:
+    """Monte Carlo tree search with random playouts, an alternative to MiniMax where the tree is too wide to search
+    Budgeted by a number of playouts and/or a time limit in seconds, playouts can be spread over several processes"""
+
+    def __init__(self, win_condition, playouts=PLAYOUTS, time_limit=None, processes=1, guided=False, seed=None):
+        self._win_condition = 'full' in win_condition
+        self._playouts = playouts
+        self._time_limit = time_limit
+        self._processes = processes
+        self._guided = guided
+        self._rng = random.Random(seed)
+        self._pool = None
+        self.playouts_per_second = 0.
+
+    def _outcome(self, completed):
+        """Outcome of a move for the player who made it, None when the game goes on
+        A move completing both players' sequences wins for the player who made it"""
+        own, other = completed[self._win_condition], completed[not self._win_condition]
+        return WIN if own else (LOSS if other else None)
+
+    def _outcome_for_mover(self, completed, engine_moved):
+        if engine_moved:
+            return self._outcome(completed)
+        colors, dots = completed
+        return self._outcome((dots, colors))
+
+    def _playout_move(self, board, moves, engine_to_move):
+        if self._guided:  # Take an immediate win when there is one
+            for move in moves:
+                if self._outcome_for_mover(completed_sequences(board, [move]), engine_to_move) == WIN:
+                    return move
+        return self._rng.choice(moves)
+
+    def _playout(self, board, path):
+        """Plays random moves after the path on a copy of the board
+        Returns the outcome for the player who made the last move of the path"""
+        board = GameBoard.from_bytes(board.to_bytes())
+        for move in path:
+            board.apply_move(move)
+
+        engine_to_move = len(path) % 2 == 0
+        while board.num_moves < MAX_MOVES:
+            moves = board.generate_moves()
+            if not moves:  # Stuck without a legal move
+                return DRAW
+            if board.num_moves + 1 >= MAX_MOVES:  # The last move is a draw even if it completes a sequence
+                return DRAW
+            move = self._playout_move(board, moves, engine_to_move)
+            result = self._outcome_for_mover(completed_sequences(board, [move]), engine_to_move)
+            board.apply_move(move)
+            if result is not None:
+                won = result == WIN
+                mover_is_last = engine_to_move == (len(path) % 2 == 1)
+                return WIN if won == mover_is_last else LOSS
+            engine_to_move = not engine_to_move
+        return DRAW
+
+    def _expand(self, board, node, path):
+        if node.untried is None:
+            node.untried = board.generate_moves(path)
+            self._rng.shuffle(node.untried)
+        if not node.untried:
+            return node, path
+
+        move = node.untried.pop()
+        path = path + [move]
+        result = None
+        if board.num_moves + len(path) >= MAX_MOVES:
+            result = DRAW
+        else:
+            result = self._outcome_for_mover(completed_sequences(board, path), len(path) % 2 == 1)
+        child = _Node(move, node, result)
+        node.children.append(child)
+        return child, path
+
+    def _search(self, board, playouts, time_limit):
+        """Grows a tree from the board, returns the root and the number of playouts done"""
+        root = _Node()
+        root.visits = 1
+        deadline = perf_counter() + time_limit if time_limit else None
+        done = 0
+        while (playouts is None or done < playouts) and (deadline is None or perf_counter() < deadline):
+            node, path = root, []
+            while node.result is None and node.untried is not None and not node.untried and node.children:
+                node = node.select()
+                path.append(node.move)
+            if node.result is None:
+                node, path = self._expand(board, node, path)
+
+            result = node.result if node.result is not None else self._playout(board, path)
+            while node is not root:
+                node.visits += 1
+                node.wins += result
+                result = 1 - result  # Outcome for the player who made the parent move
+                node = node.parent
+            root.visits += 1
+            done += 1
+        return root, done
+
+    def search(self, board, playouts=None, time_limit=None):
+        """Searches the board in this process
+        Returns the visits and wins of each root move, keyed by its notation, and the number of playouts done"""
+        root, done = self._search(board, playouts, time_limit)
+        return {str(child.move): (child.visits, child.wins) for child in root.children}, done
+
+    def _parallel_search(self, board):
+        """Root parallelization, every process grows its own tree and root statistics are summed"""
+        if not self._pool:
+            self._pool = Pool(self._processes)
+        playouts = -(-self._playouts // self._processes) if self._playouts else None
+        args = [(board.to_bytes(), self._win_condition, playouts, self._time_limit, self._guided,
+                 self._rng.randrange(1 << 32)) for _ in range(self._processes)]
+        stats, total = {}, 0
+        for worker_stats, done in self._pool.map(_search_worker, args):
+            total += done
+            for move, (visits, wins) in worker_stats.items():
+                old_visits, old_wins = stats.get(move, (0, 0.))
+                stats[move] = (old_visits + visits, old_wins + wins)
+        return stats, total
+
+    def close(self):
+        if self._pool:
+            self._pool.close()
+            self._pool = None
+
+    def _trace(self, trace_file, playouts, e, stats):
+        if trace_file:
+            trace_file.writelines(
+                [str(playouts), '\n{:.3f}\n\n'.format(e)] +
+                ['{} {} {:.3f}\n'.format(move, visits, wins / visits) for move, (visits, wins) in stats.items()] +
+                ['\n']
+            )
+
+    def make_move(self, board, trace_file):
+        start = perf_counter()
+        winning = [move for move in board.generate_moves()
+                   if self._outcome(completed_sequences(board, [move])) == WIN]
+        if winning:
+            stats, playouts = {str(winning[0]): (1, WIN)}, 0
+        elif self._processes > 1:
+            stats, playouts = self._parallel_search(board)
+        else:
+            stats, playouts = self.search(board, self._playouts, self._time_limit)
+        elapsed = perf_counter() - start
+        self.playouts_per_second = playouts / elapsed if elapsed else 0.
+
+        best = max(stats, key=lambda move: stats[move][0])
+        visits, wins = stats[best]
+        self._trace(trace_file, playouts, wins / visits, stats)
+
+        print("MCTS: {} playouts in {:.2f}s ({:.0f} playouts/s), win rate {:.3f}".format(
+            playouts, elapsed, self.playouts_per_second, wins / visits))
+        print("Computer move: {}".format(best))
+
+        return board.apply_move(Move.from_str(best))
+
+
+def _search_worker(args):
+    data, win_condition, playouts, time_limit, guided, seed = args
+    engine = MCTS(['full'] if win_condition else ['red'], playouts, time_limit, guided=guided, seed=seed)
+    return engine.search(GameBoard.from_bytes(data), playouts, time_limit)
@@ -1,59 +1,242 @@
-from heuristics import informed
+import os
+import sys
+from concurrent.futures import Future
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+from board import MAX_CARDS, MAX_MOVES, moves_to_positions
+from heuristics import informed, completed_sequences, INF
+from pns import ProofNumberSearch
 
 MAX_DEPTH = 3
+MEMORY_CHECK_INTERVAL = 1024  # Nodes between two reads of the process memory usage
+_PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+_MAXRSS_UNIT = 1 if sys.platform == 'darwin' else 1024  # ru_maxrss is in bytes on macOS, in KB elsewhere
+
+
+class _BudgetExceeded(Exception):
+    pass
+
+
+def _memory_usage():
+    """Resident memory of this process in bytes, read from /proc on Linux
+    Elsewhere only the peak is available, so memory freed since then still counts, and 0 where not even that is"""
+    try:
+        with open('/proc/self/statm') as file:
+            return int(file.read().split()[1]) * _PAGE_SIZE
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * _MAXRSS_UNIT if resource else 0
 
 
 class MiniMax:
 
-    def __init__(self, win_condition):
-        self._reset()
+    def __init__(self, win_condition, depth=MAX_DEPTH, weights=None, max_nodes=None, max_memory=None,
+                 proof_nodes=None, evaluator=None):
+        """max_nodes and max_memory (in bytes, checked every MEMORY_CHECK_INTERVAL nodes) bound each move's search
+        When either is set, the search deepens one ply at a time and plays the best move of the last full ply
+        Given proof_nodes (pns.PROOF_NODES fits most positions), a proof-number search looks for a forced win first
+        once cards are recycled
+        Its nodes count against max_nodes, of which it gets half at most so that the search is left the rest
+        An evaluation.EvaluationService shared by the engines of concurrent games can score their leaves in batches"""
         self._win_condition = 'full' in win_condition
+        self._evaluator = evaluator
+        self._solver = ProofNumberSearch(win_condition, proof_nodes) if proof_nodes else None
+        self._proof_nodes = proof_nodes
+        self._depth = depth
+        self._weights = weights
+        self._max_nodes = max_nodes
+        self._max_memory = max_memory
+        self.budget_used = {}
+        self._reset()
 
     def _reset(self):
         self._num_evals = 0
+        self._num_nodes = 0
+        self._memory = 0
         self._level_2_nodes = []
+        self._root_results = {}
+        self._search_depth = self._depth
+        self._positions = None  # Positions along the current path, only tracked once cards are recycled
+
+    def _visit(self):
+        """Counts a node against the budget, stopping the search once it is spent"""
+        if self._max_nodes is not None and self._num_nodes >= self._max_nodes:
+            raise _BudgetExceeded()
+        self._num_nodes += 1
+        if self._max_memory is not None and self._num_nodes % MEMORY_CHECK_INTERVAL == 0:
+            self._memory = _memory_usage()
+            if self._memory > self._max_memory:
+                raise _BudgetExceeded()
 
     def _condition_for_level(self, level):
         return (level + self._win_condition) % 2
 
-    def _trace(self, trace_file, e):
+    def _trace(self, trace_file, e, shortcut=None):
         if trace_file:
             trace_file.writelines(
                 [str(self._num_evals), '\n{:.1f}\n\n'.format(e)] +
                 ['{:.1f}\n'.format(val) for val in self._level_2_nodes] +
+                (['shortcut: {}\n'.format(shortcut)] if shortcut else []) +
                 ['\n']
             )
 
+    def _wins(self, completed, own):
+        """Whether the completed (colors, dots) sequences win for the player to move (own) or for the opponent"""
+        return completed[self._win_condition] if own else completed[not self._win_condition]
+
+    def _scan_threats(self, board, moves):
+        """Looks only at the sequences filled by each move instead of scoring whole boards
+        Returns the moves winning immediately, and the moves leaving the opponent no immediate win when it has one
+        Each reply checked for a block counts against the budget, once it is spent only the blocks found are kept"""
+        completed = {move: completed_sequences(board, [move]) for move in moves}
+        wins = [move for move in moves if self._wins(completed[move], True)]
+        if wins or not any(self._wins(sequences, False) for sequences in completed.values()):
+            return wins, None
+
+        blocks = []
+        try:
+            for move in moves:
+                if not self._wins(completed[move], False) and not self._loses(board, move):
+                    blocks.append(move)
+        except _BudgetExceeded:
+            return wins, blocks or None
+        return wins, blocks
+
+    def _loses(self, board, move):
+        """Whether the opponent has a reply to the move winning immediately"""
+        for reply in board.generate_moves([move]):
+            self._visit()
+            if self._wins(completed_sequences(board, [move, reply]), False):
+                return True
+        return False
+
     def _min_max(self, level, sub_results):
         fn = (min, max)[self._condition_for_level(level)]  # Color maximizes, dots minimize
         return fn(sub_results.items())
 
-    def _evaluate(self, board, possible_moves, path=None, level=1):
+    def _position_key(self, board, path):
+        return board.position_key(moves_to_positions(path)) if self._positions is not None else None
+
+    def _is_draw(self, board, path, key):
+        """Whether the path reaches the move limit or a position already seen on the path"""
+        return board.num_moves + len(path) >= MAX_MOVES or (key is not None and key in self._positions)
+
+    def _evaluate(self, board, moves, path=None, level=1):
         """Recursively walks the state tree and determines the e(n) for each node
         Returns the best node's e(n) and its path"""
-        if isinstance(possible_moves, dict):  # Not deepest level of tree
-            path = path or []
-            sub_results = {}
-            for move, next_level in possible_moves.items():
-                e, result_path = self._evaluate(board, next_level, path=path + [move], level=level + 1)
+        path = path or []
+        if not moves and path:  # Left without a legal move, a draw as in MCTS playouts
+            return 0, path
+        sub_results = {}
+        if level == 1:
+            self._root_results = sub_results
+
+        if level < self._search_depth - 1:  # Not deepest level of tree
+            for move in moves:
+                self._visit()
+                next_path = path + [move]
+                key = self._position_key(board, next_path)
+                if self._is_draw(board, next_path, key):
+                    e, result_path = 0, next_path
+                elif key is None:
+                    e, result_path = self._evaluate(board, board.generate_moves(next_path), next_path, level + 1)
+                else:
+                    self._positions.add(key)
+                    e, result_path = self._evaluate(board, board.generate_moves(next_path), next_path, level + 1)
+                    self._positions.remove(key)
                 sub_results[e] = result_path
                 if level == 1:
                     self._level_2_nodes.append(e)
             return self._min_max(level, sub_results)
 
-        # Deepest level is a list of moves instead of a dict
+        # Deepest level, positions are scored instead of expanded, all at once when an evaluator batches them
         condition = self._condition_for_level(level)
-        sub_results = {informed(board, path + [move], condition): path + [move] for move in possible_moves}
-        self._num_evals += len(possible_moves)
+        leaves = []
+        try:
+            for move in moves:
+                self._visit()
+                next_path = path + [move]
+                leaves.append((0 if self._is_draw(board, next_path, self._position_key(board, next_path)) else
+                               self._score(board, next_path, condition), next_path))
+                self._num_evals += 1
+        finally:  # Leaves scored before the budget ran out still count, a first ply cut short plays the best of them
+            for e, next_path in leaves:
+                sub_results[e.result() if isinstance(e, Future) else e] = next_path
         return self._min_max(level, sub_results)
 
+    def _score(self, board, path, condition):
+        if self._evaluator:
+            return self._evaluator.submit(board, path, condition, self._weights)
+        return informed(board, path, condition, self._weights)
+
+    def _search(self, board, moves, max_depth):
+        """Searches to max_depth, or when budgeted deepens from one ply until max_depth or the budget is spent"""
+        if self._max_nodes is None and self._max_memory is None:
+            self._search_depth = max_depth
+            return self._evaluate(board, moves)
+
+        best, level_2_nodes = None, []
+        for depth in range(2, max_depth + 1):
+            self._search_depth = depth
+            self._level_2_nodes = []
+            if self._positions is not None:
+                self._positions = {board.position_key({})}
+            try:
+                best = self._evaluate(board, moves)
+                level_2_nodes = self._level_2_nodes
+            except _BudgetExceeded:
+                if not best:  # Not even one ply was completed, settle for the moves looked at so far
+                    best = self._min_max(1, self._root_results) if self._root_results else (0, moves[:1])
+                self._search_depth = depth - 1
+                break
+
+        self._level_2_nodes = level_2_nodes
+        self._memory = _memory_usage()
+        self.budget_used = {'nodes': self._num_nodes, 'max nodes': self._max_nodes, 'memory': self._memory,
+                            'max memory': self._max_memory, 'depth': self._search_depth}
+        print("Budget used: {} of {} nodes, {:.1f} of {} MB, searched to depth {}".format(
+            self._num_nodes, self._max_nodes, self._memory / 2 ** 20,
+            '{:.1f}'.format(self._max_memory / 2 ** 20) if self._max_memory else None, self._search_depth))
+        return best
+
+    def _prove(self, board, moves):
+        """Looks for a forced win with the solver, within half of the nodes left and unless memory is already spent
+        Skipped when its budget cannot cover the shortest proof past the threat scan, answering every defense to a
+        move with a win, about b * b + b nodes for b moves"""
+        max_nodes = self._proof_nodes
+        if self._max_nodes is not None:
+            max_nodes = min(max_nodes, (self._max_nodes - self._num_nodes) // 2)
+        if max_nodes < len(moves) ** 2 + len(moves) or \
+                (self._max_memory is not None and _memory_usage() > self._max_memory):
+            return None
+        line = self._solver.prove(board, max_nodes)
+        self._num_nodes += self._solver.num_nodes
+        return line
+
     def make_move(self, board, trace_file):
         self._reset()
 
-        e, best_moves = self._evaluate(board, board.possible_moves(MAX_DEPTH))
-        self._trace(trace_file, e)
+        moves = board.generate_moves()
+        wins, blocks = self._scan_threats(board, moves)
+        line = self._prove(board, moves) if not wins and self._solver and board.num_moves >= MAX_CARDS else None
+        if wins:
+            e, best_moves = INF * (-1, 1)[not self._win_condition], wins[:1]
+            self._trace(trace_file, e, 'win')
+        elif line:
+            e, best_moves = INF * (-1, 1)[not self._win_condition], line
+            self._trace(trace_file, e, 'forced win in {} plies, proven in {} nodes'.format(
+                len(line), self._solver.num_nodes))
+        else:
+            if board.num_moves >= MAX_CARDS:
+                self._positions = {board.position_key({})}
+            # Plies past the move limit cannot change the result, the last one reaching it is scored as a draw
+            e, best_moves = self._search(board, blocks or moves, min(self._depth, MAX_MOVES - board.num_moves + 1))
+            self._trace(trace_file, e, 'block among {} moves'.format(len(blocks)) if blocks else None)
 
         print("Found path: {} with e={}".format([str(move) for move in best_moves], e))
         print("Computer move: {}".format(best_moves[0]))
 
-        return board.make_move(best_moves[0])
+        return board.apply_move(best_moves[0])
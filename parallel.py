@@ -0,0 +1,68 @@
+from multiprocessing import Pool
+from multiprocessing.shared_memory import SharedMemory
+
+from board import GameBoard, ENCODED_SIZE
+
+_attached = {}  # Shared memory block currently opened by this worker process, by name
+
+
+class SharedPositions:
+    """Fixed-size slots of encoded positions in shared memory
+    Other processes open the same block by name and decode a slot without any pickling"""
+
+    def __init__(self, size=0, name=None):
+        self._memory = SharedMemory(name=name, create=name is None, size=max(size, 1) * ENCODED_SIZE)
+        self.name = self._memory.name
+        self.size = size if name is None else self._memory.size // ENCODED_SIZE
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, index):
+        return GameBoard.from_bytes(self._memory.buf[index * ENCODED_SIZE:(index + 1) * ENCODED_SIZE])
+
+    def __setitem__(self, index, board):
+        self._memory.buf[index * ENCODED_SIZE:(index + 1) * ENCODED_SIZE] = board.to_bytes()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+        self.unlink()
+
+    def close(self):
+        self._memory.close()
+
+    def unlink(self):
+        self._memory.unlink()
+
+
+def _attach(name):
+    """Opens a block created by the parent once per worker, the parent unlinks it when the batch is done"""
+    if name not in _attached:
+        for positions in _attached.values():  # Previous batch, already unlinked by the parent
+            positions.close()
+        _attached.clear()
+        _attached[name] = SharedPositions(name=name)
+    return _attached[name]
+
+
+def _call(args):
+    fn, name, index = args
+    return fn(_attach(name)[index])
+
+
+def map_positions(fn, boards, processes=None, pool=None):
+    """Calls fn on every board in a pool of worker processes
+    Boards are handed over through shared memory, only (fn, block name, slot) is pickled per task
+    fn must be a module level function so that workers can import it"""
+    boards = list(boards)
+    with SharedPositions(len(boards)) as positions:
+        for i, board in enumerate(boards):
+            positions[i] = board
+        tasks = [(fn, positions.name, i) for i in range(len(boards))]
+        if pool:
+            return pool.map(_call, tasks)
+        with Pool(processes) as pool:
+            return pool.map(_call, tasks)
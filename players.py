@@ -10,10 +10,11 @@ _rec_format = re.compile(RECYCLE_FORMAT)
 
 
 class Player:
-    def __init__(self, name, is_human, win_condition):
+    def __init__(self, name, is_human, win_condition, engine=None):
         self.name = name
         self.is_human = is_human
-        self.move = self._player_move if is_human else MiniMax(win_condition).make_move
+        self.engine = None if is_human else engine or MiniMax(win_condition)
+        self.move = self._player_move if is_human else self.engine.make_move
         self.condition = win_condition
 
     def _player_move(self, board, _):
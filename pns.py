@@ -0,0 +1,116 @@
+from board import MAX_MOVES, moves_to_positions
+from heuristics import completed_sequences, INF
+
+PROOF_NODES = 60000  # Enough to answer every defense in a recycling position, about 150 moves each
+
+
+class _Node:
+    __slots__ = ('move', 'parent', 'children', 'proof', 'disproof', 'attacker')
+
+    def __init__(self, move=None, parent=None, attacker=True):
+        self.move = move
+        self.parent = parent
+        self.children = None  # Not expanded yet
+        self.proof = 1
+        self.disproof = 1
+        self.attacker = attacker  # Whether the side proving the win is to move here, an OR node
+
+    def set_result(self, won):
+        self.proof, self.disproof = (0, INF) if won else (INF, 0)
+
+    def update(self):
+        """Recomputes the proof and disproof numbers from the children"""
+        if self.attacker:
+            self.proof = min(child.proof for child in self.children)
+            self.disproof = sum(child.disproof for child in self.children)
+        else:
+            self.proof = sum(child.proof for child in self.children)
+            self.disproof = min(child.disproof for child in self.children)
+
+
+class ProofNumberSearch:
+    """Proves or disproves a forced win for the side to move within a budget of nodes
+    The move limit, repeated positions and being left without a move all count as failing to win, so a proof is
+    always a real forced win"""
+
+    def __init__(self, win_condition, max_nodes=PROOF_NODES):
+        self._win_condition = 'full' in win_condition
+        self._max_nodes = max_nodes
+        self.num_nodes = 0
+
+    def _result(self, board, path, attacker_moved):
+        """Whether the last move of the path wins for the attacker, loses, or None when the game goes on"""
+        if board.num_moves + len(path) >= MAX_MOVES:  # The last move is a draw even if it completes a sequence
+            return False
+        colors, dots = completed_sequences(board, path)
+        attacker, defender = (dots, colors) if self._win_condition else (colors, dots)
+        if attacker or defender:  # A move completing both players' sequences wins for the player who made it
+            return attacker and (attacker_moved or not defender)
+        return None
+
+    @staticmethod
+    def _repeated(board, path):
+        """Whether the position after the path was already reached earlier on it with the same side to move"""
+        key = board.position_key(moves_to_positions(path))
+        return any(key == board.position_key(moves_to_positions(path[:i])) for i in range(len(path) - 2, -1, -2))
+
+    def _expand(self, board, node, path, max_nodes):
+        """Returns False, leaving the node as it is, when its children would not fit in max_nodes"""
+        if self._repeated(board, path):
+            node.set_result(False)
+            return True
+        moves = board.generate_moves(path)
+        if self.num_nodes + len(moves) > max_nodes:
+            return False
+        node.children = []
+        for move in moves:
+            self.num_nodes += 1
+            child = _Node(move, node, not node.attacker)
+            result = self._result(board, path + [move], node.attacker)
+            if result is not None:
+                child.set_result(result)
+            node.children.append(child)
+        if node.children:
+            node.update()
+        else:
+            node.set_result(False)
+        return True
+
+    def _most_proving(self, node):
+        path = []
+        while node.children:
+            node = min(node.children, key=(lambda child: child.disproof, lambda child: child.proof)[node.attacker])
+            path.append(node.move)
+        return node, path
+
+    def prove(self, board, max_nodes=None):
+        """Returns a winning line for the side to move, or None if no forced win was proven within the budget
+        max_nodes lowers the budget for this call, num_nodes never exceeds it"""
+        self.num_nodes = 0
+        max_nodes = self._max_nodes if max_nodes is None else min(max_nodes, self._max_nodes)
+        root = _Node()
+        while root.proof and root.disproof:
+            node, path = self._most_proving(root)
+            if not self._expand(board, node, path, max_nodes):
+                break
+            while node.parent:
+                node = node.parent
+                old = node.proof, node.disproof
+                node.update()
+                if (node.proof, node.disproof) == old:
+                    break
+
+        if root.proof:
+            return None
+        line, node = [], root
+        while node.children:  # The quickest win against the longest defense
+            node = (max, min)[node.attacker]((child for child in node.children if not child.proof), key=_length)
+            line.append(node.move)
+        return line
+
+
+def _length(node):
+    """Plies to the end of the game along a proven line from the node"""
+    if not node.children:
+        return 0
+    return 1 + (max, min)[node.attacker](_length(child) for child in node.children if not child.proof)
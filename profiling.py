@@ -0,0 +1,103 @@
+import cProfile
+import os
+import pstats
+import tracemalloc
+from functools import wraps
+from threading import Event, Thread
+from time import perf_counter
+
+PROFILE_FILE = os.environ.get('DOUBLE_CARD_PROFILE')
+PROFILED_MODULES = ('board', 'heuristics', 'minimax')
+REPORT_LINES = 30  # Functions and allocation sites listed in each section of the report
+SAMPLE_INTERVAL = 0.1  # Seconds between two memory snapshots during a move, each slower as traced memory grows
+
+
+class _Sampler:
+    """Snapshots the memory traced since the start of a move from another thread every interval
+    Keeps the largest size seen for each line, so allocations freed before the end of the move still show"""
+
+    def __init__(self, filters, interval=SAMPLE_INTERVAL):
+        self._filters = filters
+        self._interval = interval
+        self._stopped = Event()
+        self._thread = Thread(target=self._run, name='memory sampler', daemon=True)
+        self.peaks = {}  # (file, line) -> (size, count) when the line's size was the largest
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+        self._sample()
+        return self.peaks
+
+    def _run(self):
+        while not self._stopped.wait(self._interval):
+            self._sample()
+
+    def _sample(self):
+        for stat in tracemalloc.take_snapshot().filter_traces(self._filters).statistics('lineno'):
+            frame = stat.traceback[0]
+            if stat.size > self.peaks.get((frame.filename, frame.lineno), (0, 0))[0]:
+                self.peaks[frame.filename, frame.lineno] = stat.size, stat.count
+
+
+class Profiler:
+    """Profiles engine moves with cProfile and tracemalloc, aggregated over a whole game
+    Only moves wrapped with wrap are profiled, so nothing else pays for it"""
+
+    def __init__(self, modules=PROFILED_MODULES):
+        self._modules = modules
+        self._stats = None
+        self._allocations = {}  # (file, line) -> [size, count] at their peak during a move, summed over the moves
+        self._filters = [tracemalloc.Filter(True, '*{}{}.py'.format(os.sep, module)) for module in modules]
+        self.moves = 0
+        self.elapsed = 0.
+        self.peaks = []
+
+    def wrap(self, make_move):
+        @wraps(make_move)
+        def profiled(board, trace_file):
+            profile = cProfile.Profile()
+            tracemalloc.start()
+            sampler = _Sampler(self._filters)
+            sampler.start()
+            start = perf_counter()
+            try:
+                return profile.runcall(make_move, board, trace_file)
+            finally:
+                self.elapsed += perf_counter() - start
+                self._record(profile, sampler.stop(), tracemalloc.get_traced_memory()[1])
+                tracemalloc.stop()
+        return profiled
+
+    def _record(self, profile, allocations, peak):
+        self.moves += 1
+        self.peaks.append(peak)
+        if self._stats:
+            self._stats.add(profile)
+        else:
+            self._stats = pstats.Stats(profile)
+        for line, (size, count) in allocations.items():
+            totals = self._allocations.setdefault(line, [0, 0])
+            totals[0] += size
+            totals[1] += count
+
+    def write_report(self, path):
+        with open(path, 'w') as file:
+            file.write('{} engine moves profiled in {:.2f}s, peak traced memory {:.1f} KB (mean {:.1f} KB)\n\n'.format(
+                self.moves, self.elapsed, max(self.peaks, default=0) / 1024,
+                sum(self.peaks) / len(self.peaks) / 1024 if self.peaks else 0))
+            if not self._stats:
+                return
+
+            file.write('Time by function in {}\n'.format(', '.join(self._modules)))
+            self._stats.stream = file
+            self._stats.sort_stats('tottime').print_stats(r'({})\.py'.format('|'.join(self._modules)), REPORT_LINES)
+
+            file.write('Memory allocated during a move, by line at its peak, summed over the moves\n')
+            hot_spots = sorted(self._allocations.items(), key=lambda item: item[1][0], reverse=True)
+            for (filename, lineno), (size, count) in hot_spots[:REPORT_LINES]:
+                file.write('{:>10.1f} KB {:>8} blocks  {}:{}\n'.format(
+                    size / 1024, count, os.path.basename(filename), lineno))
@@ -0,0 +1,124 @@
+import os
+from argparse import ArgumentParser
+from itertools import islice
+from multiprocessing import Pool
+
+from board import GameBoard, Move
+from heuristics import informed
+
+RECORDS_FILE = os.environ.get('DOUBLE_CARD_RECORDS')
+SEPARATOR = ';'
+CONDITIONS = {
+    'C': ['red', 'white'],
+    'D': ['full', 'open'],
+}
+CHUNK_SIZE = 10000  # Records read ahead of the workers at most
+
+
+class GameRecord:
+    """One finished game, stored as a single line: the players' conditions then every move in Move.__str__ notation
+    e.g. 'CD;0 3 A 1;0 7 C 1;...;A 3 A 4 2 G 1'"""
+
+    @staticmethod
+    def from_str(str_):
+        conditions, *moves = str_.rstrip('\n').split(SEPARATOR)
+        return GameRecord([CONDITIONS[letter] for letter in conditions], moves)
+
+    def __init__(self, conditions, moves):
+        self.conditions = conditions
+        self.moves = [str(move) for move in moves]
+
+    def __str__(self):
+        return SEPARATOR.join([''.join('C' if 'red' in condition else 'D' for condition in self.conditions)] +
+                              self.moves)
+
+    def replay(self, checked=False):
+        """Yields the board after each move, the same board object updated in place
+        Moves go through make_move when checked, otherwise they are trusted to have been legal when played"""
+        board = GameBoard()
+        for move in self.moves:
+            move = Move.from_str(move)
+            if checked:
+                result = board.make_move(move)
+                if not result.success:
+                    raise ValueError('Illegal move {} in record (reasons: {})'.format(
+                        move, [key for key, value in result.conditions.items() if not value]))
+            else:
+                board.apply_move(move)
+            yield board
+
+
+def write_record(path, record):
+    """Appends the record with a single write, so that concurrent games can share the file"""
+    with open(path, 'a') as file:
+        file.write(str(record) + '\n')
+
+
+def read_records(path):
+    """Streams the records of the file one line at a time"""
+    with open(path) as file:
+        for line in file:
+            if line.strip():
+                yield GameRecord.from_str(line)
+
+
+def outcome(record):
+    """Replays the game until it ends, returns the index of the winning player (None for a tie) and its length"""
+    result = None
+    for board in record.replay():
+        result = board.is_winning_board()
+        if result:
+            break
+    if not result:
+        return None, len(record.moves)
+
+    mover = (board.num_moves - 1) % 2
+    winning = [key for key, value in result.conditions.items() if value]
+    for player in (mover, 1 - mover):  # A move completing both players' sequences wins for the one who made it
+        if any(key in record.conditions[player] for key in winning):
+            return player, board.num_moves
+    return None, board.num_moves
+
+
+def evaluations(record):
+    """Scores the position after every move with informed, positive in favor of colors"""
+    return [informed(board, [], 'red' in record.conditions[(board.num_moves - 1) % 2])
+            for board in record.replay()]
+
+
+def analyze(path, fn, processes=None):
+    """Maps fn over every record of the file in a process pool, yielding results in file order
+    Records are read in chunks so that memory use does not grow with the size of the file
+    fn must be a module level function so that workers can import it"""
+    with open(path) as file, Pool(processes) as pool:
+        records = (line for line in file if line.strip())
+        while True:
+            chunk = list(islice(records, CHUNK_SIZE))
+            if not chunk:
+                break
+            yield from pool.imap(_call, ((fn, line) for line in chunk), chunksize=max(len(chunk) // 64, 1))
+
+
+def _call(args):
+    fn, line = args
+    return fn(GameRecord.from_str(line))
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Replays recorded games and summarizes them')
+    parser.add_argument('path', nargs='?', default=RECORDS_FILE)
+    parser.add_argument('--analysis', choices=('outcome', 'evaluations'), default='outcome')
+    parser.add_argument('--processes', type=int, default=None)
+    args = parser.parse_args()
+
+    if args.analysis == 'outcome':
+        wins, total_moves, games = [0, 0, 0], 0, 0
+        for won, num_moves in analyze(args.path, outcome, args.processes):
+            wins[won if won is not None else 2] += 1
+            total_moves += num_moves
+            games += 1
+        print('{} games, player 1 won {}, player 2 won {}, {} ties, {:.1f} moves on average'.format(
+            games, wins[0], wins[1], wins[2], total_moves / games if games else 0))
+    else:
+        for scores in analyze(args.path, evaluations, args.processes):
+            print(' '.join('{:.1f}'.format(score) for score in scores))
@@ -0,0 +1,91 @@
+import os
+import pickle
+
+import heuristics
+from board import GameBoard, Move
+from mcts import MCTS
+from minimax import MiniMax
+from players import Player
+
+SNAPSHOT_FILE = os.environ.get('DOUBLE_CARD_SNAPSHOT')
+SNAPSHOT_VERSION = 2
+CACHE_SUFFIX = '.cache'  # The evaluation cache is appended to its own file next to the snapshot
+ENGINES = {
+    'MiniMax': MiniMax,
+    'MCTS': MCTS,
+}
+_journals = set()  # Cache files started by this process, only the entries added since the last save go into them
+
+
+def save_snapshot(path, board, players, history, current_player, trace_file_path=None):
+    """Saves the game and the evaluation cache after a move
+    Written to a temporary file and moved over the previous snapshot, so a crash never leaves a partial one
+    The cache is only written in full the first time, later saves append the entries added since the previous one"""
+    snapshot = {
+        'version': SNAPSHOT_VERSION,
+        'board': board.to_bytes(),
+        'history': [str(move) for move in history],
+        'current player': current_player,
+        'players': [(player.name, player.is_human, player.condition,
+                     type(player.engine).__name__ if player.engine else None) for player in players],
+        'trace file': trace_file_path,
+        'weights': heuristics.WEIGHTS,
+    }
+    with open(path + '.tmp', 'wb') as file:
+        _dump(snapshot, file)
+    os.replace(path + '.tmp', path)
+
+    if path in _journals:
+        with open(path + CACHE_SUFFIX, 'ab') as file:
+            _dump(heuristics.cache.take_added(), file)
+    else:
+        heuristics.cache.track_added()
+        with open(path + CACHE_SUFFIX + '.tmp', 'wb') as file:
+            _dump(heuristics.cache.entries(), file)
+        os.replace(path + CACHE_SUFFIX + '.tmp', path + CACHE_SUFFIX)
+        _journals.add(path)
+
+
+def _dump(obj, file):
+    pickle.dump(obj, file, pickle.HIGHEST_PROTOCOL)
+    file.flush()
+    os.fsync(file.fileno())
+
+
+def _load_cache(path):
+    """Entries of the cache file in the order they were saved, up to a save cut short by a crash"""
+    entries = []
+    if os.path.exists(path):
+        with open(path, 'rb') as file:
+            try:
+                while True:
+                    entries += pickle.load(file)
+            except (EOFError, pickle.UnpicklingError):
+                pass
+    return entries
+
+
+def load_snapshot(path):
+    """Restores a game saved by save_snapshot, and the evaluation cache unless the weights have changed since
+    Returns the board, the players, the moves made, the number of the player to move and the trace file path"""
+    with open(path, 'rb') as file:
+        snapshot = pickle.load(file)
+    if snapshot['version'] != SNAPSHOT_VERSION:
+        raise ValueError('Unsupported snapshot version {}'.format(snapshot['version']))
+
+    if snapshot['weights'] == heuristics.WEIGHTS:
+        heuristics.cache.restore(_load_cache(path + CACHE_SUFFIX))
+        heuristics.cache.track_added()
+        _journals.add(path)
+    players = [Player(name, is_human, condition, ENGINES[engine](condition) if engine else None)
+               for name, is_human, condition, engine in snapshot['players']]
+    return GameBoard.from_bytes(snapshot['board']), players, [Move.from_str(move) for move in snapshot['history']], \
+        snapshot['current player'], snapshot['trace file']
+
+
+def remove_snapshot(path):
+    """Removes the snapshot and its cache file once the game is over, so the next one starts afresh"""
+    for file_path in (path, path + CACHE_SUFFIX):
+        if os.path.exists(file_path):
+            os.remove(file_path)
+    _journals.discard(path)
@@ -1,5 +1,6 @@
 from unittest import TestCase
-from board import GameBoard
+import board
+from board import GameBoard, Move, MAX_CARDS, ENCODED_SIZE
 
 
 class BoardTests(TestCase):
@@ -116,3 +117,67 @@ class BoardTests(TestCase):
         self.board._board[6][11] = (2, 0)
         self.board._board[7][11] = (2, 0)
         self.assertTrue(self.board.is_winning_board())
+
+    def testGeometry(self):
+        self.assertEqual(((6, 0), (7, 0)), Move(0, 1, 6, 0).cells)
+        self.assertIsNone(Move(0, 1, 7, 0).cells)
+        self.assertEqual(((7, 10), (7, 11)), Move(0, 2, 7, 10).cells)
+        self.assertIsNone(Move(0, 2, 7, 11).cells)
+        self.assertEqual({(0, 0): (board.W, board.O), (0, 1): (board.R, board.F)},
+                         board.moves_to_positions([Move(0, 2, 0, 0)]))
+        self.assertFalse(self.board.make_move(Move(0, 1, 0, 1)).success)  # Hangs over empty cells
+        self.board.make_move(Move(0, 2, 0, 0))
+        self.assertFalse(self.board.make_move(Move(0, 1, 0, 2)).success)
+        self.assertTrue(self.board.make_move(Move(0, 2, 0, 2)).success)
+
+    def testEncoding(self):
+        for move in ['0 1 A 1', '0 2 C 1', '0 8 D 1', '0 5 A 2']:
+            self.board.make_move(Move.from_str(move))
+        decoded = GameBoard.from_bytes(self.board.to_bytes())
+        self.assertEqual(ENCODED_SIZE, len(self.board.to_bytes()))
+        self.assertEqual(self.board._board, decoded._board)
+        self.assertEqual(self.board._moves, decoded._moves)
+        self.assertEqual(self.board.last_moved, decoded.last_moved)
+        self.assertEqual(self.board._num_moves, decoded._num_moves)
+        self.assertEqual(self.board.to_bytes(), decoded.to_bytes())
+
+    def testEncodingRecycle(self):
+        self.board.make_move(Move.from_str('0 1 A 1'))
+        self.board.make_move(Move.from_str('0 2 C 1'))
+        self.board._num_moves = MAX_CARDS
+        self.assertTrue(self.board.make_move(Move.from_str('A 1 B 1 4 E 1')).success)
+        decoded = GameBoard.from_bytes(self.board.to_bytes())
+        self.assertEqual(self.board._board, decoded._board)
+        self.assertEqual(self.board._moves, decoded._moves)
+        self.assertEqual(self.board.last_moved, decoded.last_moved)
+        self.assertEqual(str(self.board.last_moved), str(decoded.last_moved))
+
+    def testRecycleCovered(self):
+        self.board.make_move(Move.from_str('0 2 H 1'))
+        self.board.make_move(Move.from_str('0 1 A 1'))
+        self.board.make_move(Move.from_str('0 2 B 2'))
+        self.board._num_moves = MAX_CARDS
+        self.assertFalse(self.board.make_move(Move.from_str('A 1 B 1 1 D 1')).success)
+        self.assertTrue(self.board.make_move(Move.from_str('H 1 H 2 1 D 1')).success)
+        self.assertEqual({(1, 1)}, {move.old_pos1 for move in self.board.generate_moves()})
+
+    def testTrusted(self):
+        checked = GameBoard()
+        for move in ['0 2 H 1', '0 1 A 1', '0 2 B 2']:
+            self.assertTrue(checked.make_move(Move.from_str(move)).success)
+            self.assertTrue(self.board.apply_move(Move.from_str(move)).success)
+        checked._num_moves = self.board._num_moves = MAX_CARDS
+        for move in checked.generate_moves():
+            self.assertTrue(GameBoard.from_bytes(checked.to_bytes()).make_move(move).success)
+        move = Move.from_str('H 1 H 2 3 D 1')
+        self.assertTrue(checked.make_move(move).success)
+        self.assertTrue(self.board.apply_move(move).success)
+        self.assertEqual(checked.to_bytes(), self.board.to_bytes())
+
+    def testTrustedCheck(self):
+        board.CHECK_TRUSTED_MOVES = True
+        try:
+            self.board.apply_move(Move.from_str('0 2 H 1'))
+            self.assertRaises(ValueError, self.board.apply_move, Move.from_str('0 2 A 3'))
+        finally:
+            board.CHECK_TRUSTED_MOVES = False
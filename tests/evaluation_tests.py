@@ -0,0 +1,65 @@
+from contextlib import redirect_stdout
+from io import StringIO
+from threading import Thread
+from unittest import TestCase
+
+from board import GameBoard, Move
+from evaluation import EvaluationService
+from heuristics import INF, cache, informed, score_positions
+from minimax import MiniMax
+
+MOVES = ['0 3 A 1', '0 2 C 1', '0 4 D 1', '0 8 E 1', '0 8 H 1', '0 4 G 1', '0 1 A 2', '0 6 C 3']
+
+
+class EvaluationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.service = EvaluationService(max_delay=0.001)
+        self.boards = [GameBoard() for _ in range(len(MOVES))]
+        for i, board in enumerate(self.boards):
+            for move in MOVES[:i + 1]:
+                board.make_move(Move.from_str(move))
+
+    def tearDown(self):
+        self.service.close()
+        cache.clear()
+
+    def testScorePositions(self):
+        weights = [0, 1.5, 12.25, 90, INF]
+        keys = [board.position_key({}) for board in self.boards]
+        self.assertEqual([informed(board, [], 1) for board in self.boards], score_positions(keys))
+        cache.clear()
+        for board, value in zip(self.boards, score_positions(keys, weights)):
+            self.assertAlmostEqual(informed(board, [], 1, weights), value)
+
+    def testService(self):
+        futures = [self.service.submit(board, [Move.from_str('0 2 B 1')], 0) for board in self.boards]
+        values = [future.result(timeout=5) for future in futures]
+        cache.clear()
+        self.assertEqual([informed(board, [Move.from_str('0 2 B 1')], 0) for board in self.boards], values)
+
+    def testTieBreak(self):
+        board = GameBoard()
+        for move in [Move(0, 1, 0, 0), Move(0, 1, 0, 1), Move(0, 1, 0, 2)]:
+            board.make_move(move)
+        self.assertEqual(-INF, self.service.evaluate(board, [Move(0, 1, 0, 3), Move(0, 1, 2, 0)], 1))
+
+    def testConcurrentSearches(self):
+        boards = self.boards[2::2]
+        expected = []
+        for board in boards:
+            board = GameBoard.from_bytes(board.to_bytes())
+            with redirect_stdout(StringIO()):
+                MiniMax(['red', 'white'], depth=2).make_move(board, None)
+            expected.append(board.last_moved)
+
+        def play(board):
+            MiniMax(['red', 'white'], depth=2, evaluator=self.service).make_move(board, None)
+        threads = [Thread(target=play, args=(board,)) for board in boards]
+        with redirect_stdout(StringIO()):
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(expected, [board.last_moved for board in boards])
+        self.assertGreater(self.service.mean_batch_size, 1)
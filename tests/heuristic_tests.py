@@ -1,7 +1,10 @@
+import os
+from io import StringIO
+from tempfile import TemporaryDirectory
 from unittest import TestCase
 
-from board import R, W, F, O, EMPTY_TILE, GameBoard, Move
-from heuristics import _count_sequence, informed, INF
+from board import R, W, F, O, EMPTY_TILE, MAX_CARDS, MAX_MOVES, GameBoard, Move
+from heuristics import _count_sequence, informed, naive, INF, EvalCache, cache, load_weights, save_weights
 from minimax import MiniMax
 
 
@@ -97,6 +100,41 @@ class InformedTest(TestCase):
                                         [Move(0, 1, 6, 0), Move(0, 1, 2, 2), Move(0, 3, 2, 3), Move(0, 1, 6, 1)],
                                         1))
 
+    def testWeights(self):
+        self.board.make_move(Move(0, 3, 0, 0))
+        self.board.make_move(Move(0, 2, 2, 0))
+        with TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'weights.json')
+            save_weights(path, [0, 2, 20, 200, INF])
+            weights = load_weights(path)
+        self.assertEqual([0, 2, 20, 200, INF], weights)
+        self.assertEqual(2 * informed(self.board, [], 1), informed(self.board, [], 1, weights))
+
+
+class CacheTests(TestCase):
+    def setUp(self):
+        self.board = GameBoard()
+        cache.clear()
+
+    def testTransposition(self):
+        self.board.make_move(Move(0, 3, 0, 0))
+        e = informed(self.board, [Move(0, 2, 2, 0), Move(0, 8, 4, 0)], 1)
+        self.assertEqual(1, cache.misses)
+        self.assertEqual(e, informed(self.board, [Move(0, 8, 4, 0), Move(0, 2, 2, 0)], 1))
+        self.assertEqual(1, cache.hits)
+        self.assertEqual(naive(self.board, [Move(0, 2, 2, 0)]), naive(self.board, [Move(0, 2, 2, 0)]))
+        self.assertEqual(0.5, cache.hit_rate)
+
+    def testEviction(self):
+        lru = EvalCache(max_size=2)
+        lru.put('a', 1)
+        lru.put('b', 2)
+        lru.get('a')
+        lru.put('c', 3)
+        self.assertIsNone(lru.get('b'))
+        self.assertEqual(1, lru.get('a'))
+        self.assertEqual(2, len(lru))
+
 
 class MiniMaxTests(TestCase):
     def setUp(self):
@@ -120,3 +158,87 @@ class MiniMaxTests(TestCase):
         self.assertTrue(result.success)
         win = self.board.is_winning_board()
         self.assertFalse(win)
+
+    def testWinShortcut(self):
+        self.board.make_move(Move(0, 7, 1, 0))
+        self.board.make_move(Move(0, 3, 1, 1))
+        self.board.make_move(Move(0, 7, 1, 2))
+        trace = StringIO()
+        minimax = MiniMax(['red', 'white'])
+        self.assertTrue(minimax.make_move(self.board, trace).success)
+        self.assertEqual(0, minimax._num_evals)
+        self.assertIn('shortcut: win', trace.getvalue())
+
+    def testBlockShortcut(self):
+        self.board.make_move(Move(0, 7, 1, 0))
+        self.board.make_move(Move(0, 3, 1, 1))
+        self.board.make_move(Move(0, 7, 1, 2))
+        trace = StringIO()
+        self.assertTrue(MiniMax(['full', 'open']).make_move(self.board, trace).success)
+        self.assertIn('shortcut: block', trace.getvalue())
+        self.assertFalse(self.board.is_winning_board())
+
+    def testBlockScanBudget(self):
+        self.board.make_move(Move(0, 7, 1, 0))
+        self.board.make_move(Move(0, 3, 1, 1))
+        self.board.make_move(Move(0, 7, 1, 2))
+        minimax = MiniMax(['full', 'open'], max_nodes=50)
+        self.assertTrue(minimax.make_move(self.board, None).success)
+        self.assertLessEqual(minimax.budget_used['nodes'], 50)
+        self.assertFalse(self.board.is_winning_board())
+
+    def testMoveLimit(self):
+        self.board.make_move(Move.from_str('0 2 A 1'))
+        self.board.make_move(Move.from_str('0 2 H 1'))
+        self.board.make_move(Move.from_str('0 2 D 1'))
+        self.board._num_moves = MAX_MOVES - 1
+        trace = StringIO()
+        minimax = MiniMax(['full', 'open'])
+        self.assertTrue(minimax.make_move(self.board, trace).success)
+        self.assertEqual('0.0', trace.getvalue().split('\n')[1])
+        self.assertEqual([], minimax._level_2_nodes)
+
+    def testNoLegalMove(self):
+        for move in ['0 2 A 1', '0 2 H 1', '0 2 D 1']:
+            self.board.make_move(Move.from_str(move))
+        self.board._num_moves = MAX_CARDS
+        self.board.make_move(Move.from_str('A 1 A 2 2 C 1'))
+        reply = Move.from_str('H 1 H 2 1 C 3')
+        self.assertEqual([], self.board.generate_moves([reply]))
+        minimax = MiniMax(['full', 'open'], depth=3)
+        self.assertEqual((0, [reply]), minimax._evaluate(self.board, [reply]))
+        self.assertTrue(minimax.make_move(self.board, None).success)
+
+    def testRepetition(self):
+        self.board.make_move(Move.from_str('0 2 A 1'))
+        self.board.make_move(Move.from_str('0 2 H 1'))
+        self.board.make_move(Move.from_str('0 2 D 1'))
+        self.board._num_moves = MAX_CARDS
+        minimax = MiniMax(['full', 'open'], depth=6)
+        minimax._positions = {self.board.position_key({})}
+        path = [Move.from_str(move) for move in ['A 1 A 2 2 F 1', 'H 1 H 2 2 B 1', 'F 1 F 2 2 A 1', 'B 1 B 2 2 H 1']]
+        self.assertFalse(minimax._is_draw(self.board, path[:3], minimax._position_key(self.board, path[:3])))
+        self.assertTrue(minimax._is_draw(self.board, path, minimax._position_key(self.board, path)))
+
+    def testNodeBudget(self):
+        self.board.make_move(Move(0, 7, 1, 0))
+        minimax = MiniMax(['full', 'open'], max_nodes=100)
+        self.assertTrue(minimax.make_move(self.board, None).success)
+        self.assertEqual(2, minimax.budget_used['depth'])
+        self.assertLessEqual(minimax._num_nodes, 100)
+
+        for max_nodes in (5, 10, 30):
+            board = GameBoard()
+            board.make_move(Move(0, 7, 1, 0))
+            minimax = MiniMax(['red', 'white'], max_nodes=max_nodes)
+            scores = {informed(board, [move], 1): move for move in board.generate_moves()[:max_nodes]}
+            self.assertTrue(minimax.make_move(board, None).success)
+            self.assertEqual(scores[max(scores)], board.last_moved)  # The best of the moves scored, colors maximize
+            self.assertEqual(1, minimax.budget_used['depth'])
+
+    def testMemoryBudget(self):
+        self.board.make_move(Move(0, 7, 1, 0))
+        minimax = MiniMax(['full', 'open'], max_memory=1)
+        self.assertTrue(minimax.make_move(self.board, None).success)
+        self.assertEqual(2, minimax.budget_used['depth'])
+        self.assertGreater(minimax.budget_used['memory'], 0)
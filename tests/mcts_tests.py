@@ -0,0 +1,45 @@
+from unittest import TestCase
+
+from board import GameBoard, Move, MAX_CARDS, MAX_MOVES
+from mcts import MCTS, DRAW
+
+
+class MCTSTests(TestCase):
+    def setUp(self):
+        self.board = GameBoard()
+        self.board.make_move(Move(0, 7, 1, 0))
+        self.board.make_move(Move(0, 3, 1, 1))
+        self.board.make_move(Move(0, 7, 1, 2))
+
+    def testWinBoard(self):
+        result = MCTS(['red', 'white'], playouts=50, seed=0).make_move(self.board, None)
+        self.assertTrue(result.success)
+        win = self.board.is_winning_board()
+        self.assertTrue(win.success)
+        self.assertIn([key for key, value in win.conditions.items() if value][0], ['red', 'white'])
+
+    def testFindsWin(self):
+        stats, playouts = MCTS(['red', 'white'], seed=0).search(self.board, 400)
+        self.assertEqual(400, playouts)
+        best = max(stats, key=lambda move: stats[move][0])
+        self.assertEqual(1., stats[best][1] / stats[best][0])
+
+    def testDenyWinBoard(self):
+        engine = MCTS(['full', 'open'], playouts=400, seed=0)
+        self.assertTrue(engine.make_move(self.board, None).success)
+        self.assertFalse(self.board.is_winning_board())
+        self.assertGreater(engine.playouts_per_second, 0)
+
+    def testRecycle(self):
+        self.board._num_moves = MAX_CARDS
+        stats, playouts = MCTS(['full', 'open'], seed=0).search(self.board, 20)
+        self.assertEqual(20, playouts)
+        self.assertTrue(all(Move.from_str(move).type for move in stats))
+
+    def testPlayoutMoveLimit(self):
+        board = GameBoard()
+        for move in ['0 8 D 1', '0 4 F 1', '0 6 B 1', '0 8 H 1', '0 8 C 1', '0 8 C 3']:
+            board.make_move(Move.from_str(move))
+        board._num_moves = MAX_MOVES - 1  # 'B 1 B 2 4 E 1' completes a color sequence with the last move
+        engine = MCTS(['red', 'white'], guided=True, seed=0)
+        self.assertEqual(DRAW, engine._playout(board, []))
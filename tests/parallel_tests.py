@@ -0,0 +1,29 @@
+from unittest import TestCase
+
+from board import GameBoard, Move
+from parallel import SharedPositions, map_positions
+
+
+def _last_moved(board):
+    return str(board.last_moved)
+
+
+class SharedPositionsTests(TestCase):
+    def setUp(self):
+        self.boards = []
+        board = GameBoard()
+        for move in ['0 1 A 1', '0 2 C 1', '0 8 D 1']:
+            board.make_move(Move.from_str(move))
+            self.boards.append(GameBoard.from_bytes(board.to_bytes()))
+
+    def testSlots(self):
+        with SharedPositions(len(self.boards)) as positions:
+            for i, board in enumerate(self.boards):
+                positions[i] = board
+            attached = SharedPositions(name=positions.name)
+            self.assertEqual(self.boards[1]._board, attached[1]._board)
+            self.assertEqual(self.boards[2].last_moved, attached[2].last_moved)
+            attached.close()
+
+    def testMapPositions(self):
+        self.assertEqual(['0 1 A 1', '0 2 C 1', '0 8 D 1'], map_positions(_last_moved, self.boards, processes=2))
@@ -0,0 +1,98 @@
+from contextlib import redirect_stdout
+from io import StringIO
+from unittest import TestCase
+
+from board import MAX_CARDS, MAX_MOVES, GameBoard, Move
+from heuristics import completed_sequences
+from minimax import MiniMax
+from pns import PROOF_NODES, ProofNumberSearch
+
+
+class ProofNumberSearchTests(TestCase):
+    def setUp(self):
+        self.board = GameBoard()
+        self.board.make_move(Move(0, 7, 1, 0))
+        self.board.make_move(Move(0, 3, 1, 1))
+        self.board.make_move(Move(0, 7, 1, 2))
+
+    def testImmediateWin(self):
+        solver = ProofNumberSearch(['red', 'white'])
+        line = solver.prove(self.board)
+        self.assertEqual(1, len(line))
+        self.assertEqual((True, False), completed_sequences(self.board, line))
+
+    def testForcedWin(self):
+        board = GameBoard()
+        for move in ['0 2 B 1', '0 1 F 1', '0 2 B 3', '0 2 D 1', '0 8 B 5', '0 8 G 2']:
+            board.make_move(Move.from_str(move))
+        self.assertFalse(any(completed_sequences(board, [move])[0] for move in board.generate_moves()))
+        line = ProofNumberSearch(['red', 'white']).prove(board)
+        self.assertEqual(3, len(line))
+        for reply in board.generate_moves(line[:1]):  # Every defense leaves a winning move
+            self.assertTrue(any(completed_sequences(board, [line[0], reply, move])[0]
+                                for move in board.generate_moves([line[0], reply])))
+
+    def testDisproof(self):
+        self.board._num_moves = MAX_MOVES - 1  # Any sequence completed by the last move is a draw
+        solver = ProofNumberSearch(['red', 'white'])
+        self.assertIsNone(solver.prove(self.board))
+        self.assertEqual(len(self.board.generate_moves()), solver.num_nodes)
+
+    def testBudget(self):
+        solver = ProofNumberSearch(['full', 'open'], max_nodes=500)
+        self.assertIsNone(solver.prove(self.board))
+        self.assertLessEqual(solver.num_nodes, 500)
+        self.assertGreater(solver.num_nodes, 500 - 60)  # Stops short of an expansion that would not fit
+        self.assertIsNone(solver.prove(self.board, max_nodes=50))
+        self.assertEqual(0, solver.num_nodes)  # Not even the root's moves fit
+
+    @staticmethod
+    def _recycling_board():
+        board = GameBoard()
+        for move in ['0 2 A 1', '0 2 H 1', '0 2 D 1']:
+            board.make_move(Move.from_str(move))
+        board._num_moves = MAX_CARDS
+        return board
+
+    def testRecyclePhase(self):
+        self.assertEqual(90, len(self._recycling_board().generate_moves()))
+        minimax = MiniMax(['full', 'open'], depth=2, proof_nodes=90 * 90 + 89)
+        with redirect_stdout(StringIO()):
+            self.assertTrue(minimax.make_move(self._recycling_board(), None).success)
+        self.assertEqual(0, minimax._solver.num_nodes)  # Too few nodes to answer every defense, not even tried
+
+        minimax = MiniMax(['full', 'open'], depth=2, proof_nodes=90 * 90 + 90)
+        with redirect_stdout(StringIO()):
+            self.assertTrue(minimax.make_move(self._recycling_board(), None).success)
+        self.assertGreater(minimax._solver.num_nodes, 0)
+        self.assertGreater(minimax._num_evals, 0)  # Nothing proven, the heuristic search still ran
+
+    def testRecycleForcedWin(self):
+        board = GameBoard()
+        for move in ['0 5 A 1', '0 8 F 1', '0 2 F 3', '0 3 C 1', '0 8 D 2', '0 2 H 1', '0 7 B 2', '0 8 D 4', '0 8 F 5']:
+            board.make_move(Move.from_str(move))
+        board._num_moves = MAX_CARDS
+        moves = board.generate_moves()
+        self.assertFalse(any(any(completed_sequences(board, [move])) for move in moves))
+        trace = StringIO()
+        minimax = MiniMax(['full', 'open'], proof_nodes=PROOF_NODES)
+        with redirect_stdout(StringIO()):
+            self.assertTrue(minimax.make_move(board, trace).success)
+        self.assertIn('shortcut: forced win in 3 plies', trace.getvalue())
+        self.assertGreaterEqual(minimax._solver.num_nodes, len(moves) ** 2 + len(moves))
+        for reply in board.generate_moves():  # Every defense leaves a winning move
+            self.assertTrue(any(completed_sequences(board, [reply, move])[1] for move in board.generate_moves([reply])))
+
+    def testNodeBudget(self):
+        minimax = MiniMax(['full', 'open'], max_nodes=20000, proof_nodes=PROOF_NODES)
+        with redirect_stdout(StringIO()):
+            self.assertTrue(minimax.make_move(self._recycling_board(), None).success)
+        self.assertGreater(minimax._solver.num_nodes, 0)
+        self.assertLessEqual(minimax._solver.num_nodes, 10000)  # Half of the budget at most
+        self.assertGreater(minimax._num_evals, 0)
+        self.assertLessEqual(minimax.budget_used['nodes'], 20000)  # Solver and search nodes together
+
+        minimax = MiniMax(['full', 'open'], max_nodes=10000, proof_nodes=PROOF_NODES)
+        with redirect_stdout(StringIO()):
+            self.assertTrue(minimax.make_move(self._recycling_board(), None).success)
+        self.assertEqual(0, minimax._solver.num_nodes)  # Half of the budget cannot answer every defense
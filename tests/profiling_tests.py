@@ -0,0 +1,30 @@
+import os
+from contextlib import redirect_stdout
+from io import StringIO
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+from board import GameBoard, Move
+from minimax import MiniMax
+from profiling import Profiler
+
+
+class ProfilingTests(TestCase):
+    def testReport(self):
+        board = GameBoard()
+        board.make_move(Move.from_str('0 2 A 1'))
+        profiler = Profiler()
+        make_move = profiler.wrap(MiniMax(['full', 'open'], 2).make_move)
+        with redirect_stdout(StringIO()):
+            self.assertTrue(make_move(board, None).success)
+        self.assertEqual(1, profiler.moves)
+        self.assertEqual(2, board.num_moves)
+
+        with TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'profile.txt')
+            profiler.write_report(path)
+            with open(path) as file:
+                report = file.read()
+        self.assertIn('1 engine moves profiled', report)
+        self.assertIn('heuristics.py', report)
+        self.assertIn('minimax.py:', report)
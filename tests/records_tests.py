@@ -0,0 +1,45 @@
+import os
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+from board import Move
+from records import GameRecord, write_record, read_records, outcome, evaluations, analyze
+
+MOVES = ['0 7 B 1', '0 1 D 1', '0 3 B 2', '0 1 D 2', '0 7 B 3', '0 2 F 1', '0 3 B 4']
+
+
+class RecordTests(TestCase):
+    def setUp(self):
+        self.directory = TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'games.log')
+        self.record = GameRecord([['red', 'white'], ['full', 'open']], [Move.from_str(move) for move in MOVES])
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def testFormat(self):
+        line = str(self.record)
+        self.assertEqual('CD;' + ';'.join(MOVES), line)
+        self.assertEqual(line, str(GameRecord.from_str(line + '\n')))
+
+    def testStream(self):
+        write_record(self.path, self.record)
+        write_record(self.path, GameRecord([['full', 'open'], ['red', 'white']], MOVES[:3]))
+        records = list(read_records(self.path))
+        self.assertEqual(2, len(records))
+        self.assertEqual(MOVES[:3], records[1].moves)
+        self.assertEqual(['full', 'open'], records[1].conditions[0])
+
+    def testOutcome(self):
+        self.assertEqual((0, 7), outcome(self.record))
+        self.assertEqual((None, 3), outcome(GameRecord(self.record.conditions, MOVES[:3])))
+        self.assertEqual(float('inf'), evaluations(self.record)[-1])
+
+    def testCheckedReplay(self):
+        record = GameRecord(self.record.conditions, MOVES + ['0 1 A 5'])
+        self.assertRaises(ValueError, list, record.replay(checked=True))
+
+    def testAnalyze(self):
+        for _ in range(3):
+            write_record(self.path, self.record)
+        self.assertEqual([(0, 7)] * 3, list(analyze(self.path, outcome, processes=2)))
@@ -0,0 +1,75 @@
+import os
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+import heuristics
+from board import GameBoard, Move
+from mcts import MCTS
+from minimax import MiniMax
+from players import Player
+from snapshot import CACHE_SUFFIX, save_snapshot, load_snapshot, remove_snapshot
+
+
+class SnapshotTests(TestCase):
+    def setUp(self):
+        self.directory = TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'game.snapshot')
+        self.board = GameBoard()
+        self.history = [Move.from_str(move) for move in ['0 2 A 1', '0 1 B 1', '0 4 A 3']]
+        for move in self.history:
+            self.board.make_move(move)
+        self.players = [Player('P1', True, ['red', 'white']),
+                        Player('P2', False, ['full', 'open'], MCTS(['full', 'open']))]
+        heuristics.cache.clear()
+        heuristics.informed(self.board, [], True)
+
+    def tearDown(self):
+        heuristics.cache.clear()
+        self.directory.cleanup()
+
+    def testResume(self):
+        save_snapshot(self.path, self.board, self.players, self.history, 3, 'trace.txt')
+        self.assertEqual(['game.snapshot', 'game.snapshot.cache'], sorted(os.listdir(self.directory.name)))
+        entries = heuristics.cache.entries()
+        heuristics.cache.clear()
+
+        board, players, history, current_player, trace_file_path = load_snapshot(self.path)
+        self.assertEqual(self.board.to_bytes(), board.to_bytes())
+        self.assertEqual(self.board.last_moved, board.last_moved)
+        self.assertEqual(self.history, history)
+        self.assertEqual((3, 'trace.txt'), (current_player, trace_file_path))
+        self.assertTrue(players[0].is_human)
+        self.assertIsInstance(players[1].engine, MCTS)
+        self.assertEqual(entries, heuristics.cache.entries())
+
+    def testChangedWeights(self):
+        save_snapshot(self.path, self.board, [Player('P1', False, ['red', 'white'])], self.history, 3)
+        heuristics.cache.clear()
+        weights = heuristics.WEIGHTS[:]
+        try:
+            heuristics.set_weights([0, 2, 20, 200, heuristics.INF])
+            _, players, _, _, _ = load_snapshot(self.path)
+        finally:
+            heuristics.set_weights(weights)
+        self.assertEqual(0, len(heuristics.cache))
+        self.assertIsInstance(players[0].engine, MiniMax)
+
+    def testIncrementalCache(self):
+        save_snapshot(self.path, self.board, self.players, self.history, 3)
+        size = os.path.getsize(self.path + CACHE_SUFFIX)
+        save_snapshot(self.path, self.board, self.players, self.history, 3)
+        self.assertLess(os.path.getsize(self.path + CACHE_SUFFIX) - size, 10)  # Nothing new, an empty list
+
+        self.assertTrue(self.board.make_move(Move.from_str('0 1 D 1')).success)
+        heuristics.informed(self.board, [], True)
+        save_snapshot(self.path, self.board, self.players, self.history, 4)
+        with open(self.path + CACHE_SUFFIX, 'ab') as file:
+            file.write(b'\x80\x05partial')  # A save cut short by a crash
+        entries = heuristics.cache.entries()
+        heuristics.cache.clear()
+
+        load_snapshot(self.path)
+        self.assertEqual(2, len(entries))
+        self.assertEqual(entries, heuristics.cache.entries())
+        remove_snapshot(self.path)
+        self.assertEqual([], os.listdir(self.directory.name))
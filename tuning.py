@@ -0,0 +1,130 @@
+import json
+import os
+import random
+from argparse import ArgumentParser
+from contextlib import redirect_stdout
+from io import StringIO
+from math import exp, log
+from multiprocessing import Pool
+
+from board import GameBoard
+from heuristics import WEIGHTS, WEIGHTS_FILE, INF, SEQUENCE_LENGTH, save_weights
+from main import play_game, winner
+from minimax import MiniMax
+from players import Player
+
+CONDITIONS = (['red', 'white'], ['full', 'open'])
+CHECKPOINT_FILE = 'tuning.json'
+OPENING_MOVES = 4  # Random moves played before the engines take over, so games in a batch differ
+
+# SPSA gain sequences, a_k = A / (k + 1 + STABILITY) ** ALPHA and c_k = C / (k + 1) ** GAMMA
+A = 0.5
+C = 0.2
+ALPHA = 0.602
+GAMMA = 0.101
+STABILITY = 10
+
+
+def _weights(theta):
+    """Tuned parameters are the logs of the weights for 1 to 3 tiles, keeping them positive"""
+    return [0] + [exp(t) for t in theta] + [INF]
+
+
+def _opening(rng):
+    board = GameBoard()
+    while board.num_moves < OPENING_MOVES:
+        board.apply_move(rng.choice(board.generate_moves()))
+        if board.is_winning_board():
+            board = GameBoard()
+    return board
+
+
+def play(args):
+    """Plays one engine game between two weight vectors
+    Returns 1 if the first weights won, -1 if the second won and 0 for a tie"""
+    weights_a, weights_b, a_colors, a_first, depth, seed = args
+    conditions_a, conditions_b = CONDITIONS if a_colors else CONDITIONS[::-1]
+    players = [Player('A', False, conditions_a, MiniMax(conditions_a, depth, weights_a)),
+               Player('B', False, conditions_b, MiniMax(conditions_b, depth, weights_b))]
+    if not a_first:
+        players.reverse()
+
+    with redirect_stdout(StringIO()):
+        game_result, current_player = play_game(players, _opening(random.Random(seed)))
+    won = winner(players, game_result, current_player)
+    return 0 if won is None else (-1, 1)[players[won].name == 'A']
+
+
+def _match(pool, weights_a, weights_b, games, depth, rng):
+    """Plays games in pairs with swapped colors and the same opening, returns the mean score of weights_a"""
+    games_args = []
+    for _ in range(max(games // 2, 1)):
+        seed = rng.randrange(1 << 32)
+        a_first = rng.random() < 0.5
+        games_args += [(weights_a, weights_b, True, a_first, depth, seed),
+                       (weights_a, weights_b, False, a_first, depth, seed)]
+    scores = pool.map(play, games_args)
+    return sum(scores) / len(scores)
+
+
+def _load_checkpoint(path):
+    if os.path.exists(path):
+        with open(path) as file:
+            return json.load(file)
+    return {
+        'iteration': 0,
+        'theta': [log(weight) for weight in WEIGHTS[1:SEQUENCE_LENGTH]],
+        'history': [],
+    }
+
+
+def _save_checkpoint(path, checkpoint):
+    """Writes to a temporary file first so an interrupted run never leaves a truncated checkpoint"""
+    with open(path + '.tmp', 'w') as file:
+        json.dump(checkpoint, file, indent=1)
+    os.replace(path + '.tmp', path)
+
+
+def tune(iterations, games, depth=2, processes=None, checkpoint_path=CHECKPOINT_FILE, output=WEIGHTS_FILE, seed=None):
+    """Runs SPSA on the informed weights through self-play, resuming from the checkpoint file if it exists
+    Each iteration plays the weights perturbed in a random direction against the opposite perturbation"""
+    checkpoint = _load_checkpoint(checkpoint_path)
+    rng = random.Random(seed)
+    if 'rng' in checkpoint:  # Resume the perturbations and openings where the interrupted run left them
+        version, internal, gauss = checkpoint['rng']
+        rng.setstate((version, tuple(internal), gauss))
+    with Pool(processes) as pool:
+        for k in range(checkpoint['iteration'], iterations):
+            theta = checkpoint['theta']
+            a_k = A / (k + 1 + STABILITY) ** ALPHA
+            c_k = C / (k + 1) ** GAMMA
+            delta = [rng.choice((-1, 1)) for _ in theta]
+            theta_plus = [t + c_k * d for t, d in zip(theta, delta)]
+            theta_minus = [t - c_k * d for t, d in zip(theta, delta)]
+
+            score = _match(pool, _weights(theta_plus), _weights(theta_minus), games, depth, rng)
+            checkpoint['theta'] = [t + a_k * score / (2 * c_k) * d for t, d in zip(theta, delta)]
+            checkpoint['iteration'] = k + 1
+            checkpoint['rng'] = rng.getstate()
+            checkpoint['history'].append({'iteration': k + 1, 'score': score,
+                                          'weights': _weights(checkpoint['theta'])[:SEQUENCE_LENGTH]})
+            _save_checkpoint(checkpoint_path, checkpoint)
+            print('Iteration {}: score {:+.2f}, weights {}'.format(
+                k + 1, score, ['{:.2f}'.format(w) for w in _weights(checkpoint['theta'])[1:SEQUENCE_LENGTH]]))
+
+    weights = _weights(checkpoint['theta'])
+    save_weights(output, weights)
+    return weights
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Tunes the informed heuristic weights through engine self-play')
+    parser.add_argument('--iterations', type=int, default=100)
+    parser.add_argument('--games', type=int, default=16, help='games per iteration')
+    parser.add_argument('--depth', type=int, default=2, help='search depth of the engines during tuning')
+    parser.add_argument('--processes', type=int, default=None)
+    parser.add_argument('--checkpoint', default=CHECKPOINT_FILE)
+    parser.add_argument('--output', default=WEIGHTS_FILE)
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+    tune(args.iterations, args.games, args.depth, args.processes, args.checkpoint, args.output, args.seed)